@@ -22,3 +22,9 @@ python src/xlogominidatagen/rotateflip.py --task_id ${task_id} \
   --diff ${diff} \
   --show_ref \
   --save_img
+
+##### To generate and validate all the reference tasks and difficulties at once #####
+#python src/xlogominidatagen/rotateflip.py --batch \
+#  --diffs "easy" "medium" "hard" \
+#  --save_dir "./results/datagen" \
+#  --max_workers 2
@@ -30,10 +30,23 @@ python src/xlogominidatagen/pipeline.py --task_id ${task_id} \
   --alg xlogosyn \
   --parallel
 
+##### To run a batch of tasks on one worker pool #####
+#python src/xlogominidatagen/pipeline.py --task_ids "87" "30" "52" \
+#  --diffs "easy" "medium" \
+#  --n_codes 10 \
+#  --n_goals 10 \
+#  --n_init_pos 16 \
+#  --save_dir "./results/datagen" \
+#  --n_worlds_per_init 64 \
+#  --max_workers 2 \
+#  --alg xlogosyn \
+#  --parallel
+
 python src/xlogominidatagen/xlogosyn.py --task_id ${task_id} \
   --diff ${diff} \
   --show_ref \
   --save_img \
   --quartile 4 \
   --selection 'topk' \
-  --n_sample 3
+  --n_sample 3 \
+  --workers 2
@@ -1,5 +1,5 @@
 from src.xlogomini.components.code.xlogo_code import Code
-import zss
+from src.xlogomini.utils.tree_distance import cached_tree_distance
 
 
 class Node:
@@ -101,30 +101,15 @@ def parse_node(node_json):
 def cal_tree_distance(code_json1, code_json2):
     node1 = parse_code(code_json1)
     node2 = parse_code(code_json2)
+    return cal_node_distance(node1, node2)
 
-    def insert_cost(node):
-        # return the cost of inserting the given node
-        return 1
-
-    def remove_cost(node):
-        # return the cost of removing the given node
-        return 1
-
-    def update_cost(node1, node2):
-        # return the cost of updating node1 to node2
-        if node1.node_type != node2.node_type:
-            return 1
-        # check the attributes of the nodes and return the cost of updating them
-        # for example, if you have a "value" attribute:
-        # if node1.value != node2.value:
-        #     return 1
-        return 0
-
-    return zss.distance(node1, node2,
-                        get_children=lambda node: node.children,
-                        insert_cost=insert_cost,
-                        remove_cost=remove_cost,
-                        update_cost=update_cost)
+
+def cal_node_distance(node1, node2):
+    """
+    Same as `cal_tree_distance`, but for code trees already parsed by `parse_code`.
+    The distances are memoized by the structure of the trees.
+    """
+    return cached_tree_distance(node1, node2)
 
 
 if __name__ == '__main__':
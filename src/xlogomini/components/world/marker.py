@@ -1,7 +1,6 @@
 from src.xlogomini.utils.enums import COLORS
 from src.xlogomini.utils.enums import TCOLORS
 import numpy as np
-import pandas as pd
 
 
 class Marker(object):
@@ -168,6 +167,7 @@ class MarkerArray():
                 if self.markers[y, x].bottom:
                     markers_str[y_ + 1, x_] = f'{TCOLORS[self.markers[y, x].bottom_color]}|{TCOLORS["end"]}'
 
+        import pandas as pd
         markers_str = pd.DataFrame(markers_str)
         # insert sep cols
         for i in range(self.cols + 1):
@@ -1,5 +1,4 @@
 import numpy as np
-import pandas as pd
 from src.xlogomini.utils.helpers import yx2i
 from src.xlogomini.utils.enums import *
 from src.xlogomini.components.world.turtle import Turtle
@@ -551,6 +550,7 @@ class World(object):
                     if world_map[y_, x_] is None:
                         world_map[y_, x_] = ''
 
+        import pandas as pd
         world_map = pd.DataFrame(world_map)
 
         # insert sep cols
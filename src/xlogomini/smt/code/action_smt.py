@@ -2,6 +2,9 @@ from src.xlogomini.smt.code.base_block_smt import *
 from z3 import And, Int, Const, Or, If
 
 
+ACTIONS = {"fd": fd, "bk": bk, "lt": lt, "rt": rt}
+
+
 class ActionSMT(BaseBlockSMT):
     def __init__(self, js, id):
         BaseBlockSMT.__init__(self, js, id)
@@ -56,6 +59,14 @@ class ActionSMT(BaseBlockSMT):
         else:
             return 1
 
+    def properties_for_same_block_json(self, js):
+        """
+        The block must produce exactly `js` in `to_json`.
+        """
+        if js['type'] not in ACTIONS:
+            return False
+        return self.vars[f'block__{self.id}'] == ACTIONS[js['type']]
+
     def __len__(self):
         return 1
 
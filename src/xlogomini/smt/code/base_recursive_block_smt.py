@@ -276,6 +276,20 @@ class BaseRecursiveBlockSMT():
         C.append(Sum([If(b != noblock, 1, 0) for b in body1]) == Sum([If(b != noblock, 1, 0) for b in body2]))
         return And(C)
 
+    def properties_for_same_body_json(self, body_js):
+        """
+        The non-empty blocks of the body must produce exactly `body_js` in `to_json`,
+        no matter where the `noblock`s are placed.
+        """
+        body = [blk.vars[f'block__{blk.id}'] for blk in self.body]
+        C = [Sum([If(b != noblock, 1, 0) for b in body]) == len(body_js)]
+        for i, blk in enumerate(self.body):
+            N_NOT_NOBLOCKS_BEFORE_I = Sum([If(b != noblock, 1, 0) for b in body[:i]])
+            C.append(Implies(body[i] != noblock,
+                             Or([And(N_NOT_NOBLOCKS_BEFORE_I == k, blk.properties_for_same_block_json(js))
+                                 for k, js in enumerate(body_js)])))
+        return And(C)
+
     def properties_for_merging_repeat(self):
         import xlogomini.smt.code.repeat_smt as repeat_smt  # Move import here
         C = []
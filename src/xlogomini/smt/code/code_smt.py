@@ -83,6 +83,12 @@ class CodeSMT(BaseRecursiveBlockSMT):
             cnt_list = [smt.total_block_cnt(mutated=False) for smt in self.old_body]
         return Sum(cnt_list)
 
+    def properties_for_same_json(self, code_json):
+        """
+        The mutated code must be exactly `code_json` (the output of `to_json` with `with_run=True`).
+        """
+        return self.properties_for_same_body_json(code_json['run'])
+
     def to_json(self, models_values, with_run=False):
         code_json = []
         for smt in self.body:
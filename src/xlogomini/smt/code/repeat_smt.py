@@ -148,6 +148,16 @@ class RepeatSMT(BaseRecursiveBlockSMT):
                 total_block.append(smt.total_block_cnt(mutated))
             return Sum(total_block)
 
+    def properties_for_same_block_json(self, js):
+        """
+        The block must produce exactly `js` in `to_json`.
+        """
+        if js['type'] != 'repeat':
+            return False
+        return And(self.vars[f'block__{self.id}'] == repeat,
+                   self.vars[f'times__{self.id}'] == js['times'],
+                   self.properties_for_same_body_json(js['body']))
+
     def to_json(self, model_values):
         js = {
             "type" : 'repeat',
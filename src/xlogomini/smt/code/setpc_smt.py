@@ -2,6 +2,9 @@ from src.xlogomini.smt.code.base_block_smt import *
 from z3 import And, Int, Const, Or, If
 
 
+PCOLORS = {"white": white, "black": black, "green": green, "yellow": yellow, "blue": blue, "red": red}
+
+
 class SetPCSMT(BaseBlockSMT):
     def __init__(self, js, id):
         BaseBlockSMT.__init__(self, js, id)
@@ -46,6 +49,15 @@ class SetPCSMT(BaseBlockSMT):
         else:
             return 1
 
+    def properties_for_same_block_json(self, js):
+        """
+        The block must produce exactly `js` in `to_json`.
+        """
+        if js['type'] != 'setpc':
+            return False
+        return And(self.vars[f'block__{self.id}'] == setpc,
+                   self.vars[f'value__{self.id}'] == PCOLORS[js['value']])
+
     def __len__(self):
         return 1
 
@@ -4,6 +4,8 @@ from src.xlogomini.smt.code.base_block_smt import Block, fd, bk, lt, rt, setpc,
 CNT_MAX = 15
 CNT_MIN = 0
 
+BLOCKS = {"fd": fd, "bk": bk, "lt": lt, "rt": rt, "all": allblocks}
+
 
 class BaseConstraintSMT():
     def __init__(self, js):
@@ -112,6 +112,14 @@ class CodeConstraintsSMT():
         # rebuild vars
         self.vars = self._build_vars()
 
+    def properties_for_same_json(self, cons_json):
+        """
+        The mutated constraints must be exactly `cons_json` (the output of `to_json`).
+        """
+        return And(self.body['exactly'].properties_for_same_json(cons_json['exactly']),
+                   self.body['at_most'].properties_for_same_json(cons_json['at_most']),
+                   self.body['start_by'].properties_for_same_json(cons_json['start_by']))
+
     def to_json(self, model_values):
         cons_json = {
             "exactly" : self.body['exactly'].to_json(model_values),
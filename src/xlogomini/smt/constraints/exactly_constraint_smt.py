@@ -137,6 +137,23 @@ class ExactlyConstraintSMT(BaseConstraintSMT):
         self.vars[f"{self.id}_name"].append(Const(f"{self.id}_name__{i}", Block))
         self.vars[f"{self.id}_cnt"].append(Int(f"{self.id}_cnt__{i}"))
 
+    def properties_for_same_json(self, js):
+        """
+        The mutated constraint must be exactly `js` in `to_json`, no matter which slots are used. As in `to_json`,
+        a name used by several slots (e.g., two `all`s) takes the count of its last slot.
+        """
+        names, cnts = self.vars[f'{self.id}_name'], self.vars[f'{self.id}_cnt']
+        n = len(names)
+        C = []
+        for i in range(n):
+            C.append(Implies(names[i] != noblock, Or([names[i] == BLOCKS[blk] for blk in js.keys()])))
+            for blk, cnt in js.items():
+                I_IS_LAST_BLK = And(names[i] == BLOCKS[blk], *[names[j] != BLOCKS[blk] for j in range(i + 1, n)])
+                C.append(Implies(I_IS_LAST_BLK, cnts[i] == cnt))
+        for blk in js.keys():
+            C.append(Or([names[i] == BLOCKS[blk] for i in range(n)]))
+        return And(C)
+
     def to_json(self, model_values):
         js = {}
         for i in range(len(self.vars[f'{self.id}_name'])):
@@ -1,4 +1,4 @@
-from z3 import And, Implies, Not, Const, If, Sum
+from z3 import And, Implies, Not, Const, If, Sum, Or
 from src.xlogomini.smt.constraints.base_constraint_smt import *
 
 
@@ -32,6 +32,19 @@ class StartByConstraintSMT(BaseConstraintSMT):
         i = len(self.vars['start_name'])
         self.vars["start_name"].append(Const(f"start_name__{i}", Block))
 
+    def properties_for_same_json(self, js):
+        """
+        The non-empty names must be exactly the sequence `js`, no matter where the `noblock`s are placed.
+        """
+        names = self.vars['start_name']
+        C = [Sum([If(name != noblock, 1, 0) for name in names]) == len(js)]
+        for i in range(len(names)):
+            N_NOT_NOBLOCKS_BEFORE_I = Sum([If(name != noblock, 1, 0) for name in names[:i]])
+            C.append(Implies(names[i] != noblock,
+                             Or([And(N_NOT_NOBLOCKS_BEFORE_I == k, names[i] == BLOCKS[blk])
+                                 for k, blk in enumerate(js)])))
+        return And(C)
+
     def to_json(self, model_values):
         js = []
         for i in range(len(self.vars['start_name'])):
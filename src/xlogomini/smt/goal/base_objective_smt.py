@@ -1,3 +1,7 @@
+from src.xlogomini.utils.formulas import cnf_formula
+from z3 import If
+
+
 class ObjectiveSMT():
     def __init__(self, rows, cols, vars, objective, visited):
         self.rows = rows
@@ -10,9 +14,16 @@ class ObjectiveSMT():
         self.visited = visited
 
         self.cnfs = [objective.specs[i].cnf for i in range(len(objective.specs))]
+        self.indicators = {}  # tile -> 1 if the target item of the first spec is there, else 0
 
     def properties(self):
         pass
 
     def feasible_path(self, path):
         return True
+
+    def target_indicator(self, i):
+        # built once per tile, since `feasible_path` is asked for many paths
+        if i not in self.indicators:
+            self.indicators[i] = If(cnf_formula(self.vars, self.cnfs[0], i, 'or'), 1, 0)
+        return self.indicators[i]
@@ -1,11 +1,12 @@
 from src.xlogomini.smt.goal.base_objective_smt import ObjectiveSMT
-from z3 import And, Sum, If, Not
+from z3 import And, Sum, Not
 from src.xlogomini.utils.formulas import cnf_formula
 
 
 class CollectAllSMT(ObjectiveSMT):
     def __init__(self, rows, cols, vars, objective, visited):
         ObjectiveSMT.__init__(self, rows, cols, vars, objective, visited)
+        self.n_tar_items = None  # built at the first `feasible_path`
 
     def properties_for_emulator(self):
         cnf = self.cnfs[0]
@@ -40,8 +41,7 @@ class CollectAllSMT(ObjectiveSMT):
 
     def feasible_path(self, path):
         # number of target items in the world (e.g., for "Collect all blue shapes")
-        N_TAR_ITEMS = Sum([If(cnf_formula(self.vars, self.cnfs[0], i, 'or'), 1, 0)
-                           for i in range(self.ntiles)])
-        FEASIBLE = Sum([If(cnf_formula(self.vars, self.cnfs[0], i, 'or'), 1, 0)
-                         for i in set(path)]) == N_TAR_ITEMS
-        return FEASIBLE
\ No newline at end of file
+        if self.n_tar_items is None:
+            self.n_tar_items = Sum([self.target_indicator(i) for i in range(self.ntiles)])
+        FEASIBLE = Sum([self.target_indicator(i) for i in set(path)]) == self.n_tar_items
+        return FEASIBLE
@@ -1,5 +1,5 @@
 from src.xlogomini.smt.goal.base_objective_smt import ObjectiveSMT
-from z3 import And, Sum, If
+from z3 import And, Sum
 from src.xlogomini.utils.formulas import cnf_formula
 
 
@@ -23,6 +23,5 @@ class FindSMT(ObjectiveSMT):
         return And(C)
 
     def feasible_path(self, path):
-        FEASIBLE = Sum([If(cnf_formula(self.vars, self.cnfs[0], i, 'or'), 1, 0)
-                        for i in set(path)]) >= 1
+        FEASIBLE = Sum([self.target_indicator(i) for i in set(path)]) >= 1
         return FEASIBLE
@@ -1,9 +1,28 @@
 from src.xlogomini.smt.goal.base_objective_smt import ObjectiveSMT
-import networkx as nx
 from z3 import Not, And, Or, Sum, If
-from src.xlogomini.utils.graph import build_empty_world_graph
+from src.xlogomini.utils.grid import shortest_path_tiles
 from src.xlogomini.utils.formulas import cnf_formula
 
+# positions calculated in this process, by (rows, cols, visited)
+_forb_positions_cache = {}
+
+
+def possible_forb_positions(rows, cols, visited):
+    """
+    Return the tiles off the trace that are on a shortest path between two tiles of the trace, in the empty grid.
+    The shortest paths between the ends of a sub-trace cover the rectangle spanned by them (see `shortest_path_tiles`),
+    so only the pairs of distinct tiles of the trace are needed.
+    """
+    key = (rows, cols, tuple(visited))
+    if key not in _forb_positions_cache:
+        tiles = sorted(set(visited))
+        positions = set()
+        for i in range(len(tiles)):
+            for j in range(i + 1, len(tiles)):
+                positions.update(shortest_path_tiles(cols, tiles[i], tiles[j]))
+        _forb_positions_cache[key] = positions - set(visited)  # forbidden items cannot be on the trace
+    return _forb_positions_cache[key]
+
 
 class ForbidSMT(ObjectiveSMT):
     def __init__(self, rows, cols, vars, objective, visited):
@@ -22,18 +41,7 @@ class ForbidSMT(ObjectiveSMT):
 
         # put forbidden items only at similar position as standalone walls
         # those positions are not covered by shortest path
-        graph = build_empty_world_graph(self.rows, self.cols)
-        possible_forb_items_pos = set()
-        for i in range(len(self.visited)):
-            for j in range(i + 1, len(self.visited)):
-                sub_visited = self.visited[i: j + 1]
-                shortest_paths = list(nx.all_shortest_paths(graph,
-                                                            source=sub_visited[0],
-                                                            target=sub_visited[-1]))
-                for path in shortest_paths:
-                    possible_forb_items_pos.update(set(path))
-
-        possible_forb_items_pos -= set(self.visited)  # forbidden items cannot be on the trace
+        possible_forb_items_pos = possible_forb_positions(self.rows, self.cols, self.visited)
 
         # When the code is "fd, fd", there would be no possible positions for forbidden items,
         # then we don't add such a constraints. However, when there are possible positions, we require the
@@ -22,6 +22,7 @@ class GoalSMT():
     def _build_smts(self):
         tar_smt = None
         forb_smts = []
+        self.smt_objs = {}  # smt -> the objective of the goal it comes from
 
         objs = self.goal.objs
         for obj_name in objs.keys():
@@ -37,13 +38,17 @@ class GoalSMT():
                     tar_smt = OBJ_REGISTRY['find'](**kwargs)
                     kwargs.update({"objective": Objective(obj_name='forbid', specs=[Spec(not_cnf(tar_smt.cnfs[0]))])})
                     forb_smts = [OBJ_REGISTRY['forbid'](**kwargs)]
+                    self.smt_objs[forb_smts[0]] = obj
                 elif obj_name == 'forbid':
                     forb_smts.append(OBJ_REGISTRY[obj_name](**kwargs))
+                    self.smt_objs[forb_smts[-1]] = obj
                 elif obj_name == 'draw':
                     kwargs.update({"edge_colors": self.edge_colors})
                     tar_smt = OBJ_REGISTRY[obj_name](**kwargs)
                 else:
                     tar_smt = OBJ_REGISTRY[obj_name](**kwargs)
+                if tar_smt is not None and tar_smt not in self.smt_objs:
+                    self.smt_objs[tar_smt] = obj
 
         return tar_smt, forb_smts
 
@@ -63,6 +68,15 @@ class GoalSMT():
             C.append(forb_smt.properties())
         return And(C)
 
+    def properties_per_objective(self):
+        """
+        Same constraints as `properties`, grouped by the objectives of the goal in the order of
+        `Goal.to_json`, e.g., to track which objectives are in an unsat core.
+        """
+        smts = ([self.tar_smt] if self.tar_smt is not None else []) + self.forb_smts
+        return [And([smt.properties() for smt in smts if self.smt_objs[smt] is obj])
+                for name in self.goal.objs.keys() for obj in self.goal.objs[name]]
+
     # def properties_for_good_placement(self):
     #     """
     #     Given the trace, infer the items' positions
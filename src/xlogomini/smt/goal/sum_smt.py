@@ -9,19 +9,19 @@ class SumSMT(ObjectiveSMT):
         self.total_cnt = objective.total_cnt
         assert self.total_cnt is not None
 
+    def target_count(self, i):
+        # count of the target items at tile i, kept linear (no product of terms) so that it can be bit-blasted
+        return If(cnf_formula(self.vars, self.cnfs[0], i, 'or'), self.vars['count'][i], 0)
+
     def properties_for_emulator(self):
-        return Sum([self.vars['count'][i] * If(cnf_formula(self.vars, self.cnfs[0], i, 'or'), 1, 0)
-                    for i in set(self.visited)]) == self.total_cnt
+        return Sum([self.target_count(i) for i in set(self.visited)]) == self.total_cnt
 
     def properties(self):
         pre_visited_set = set(self.visited) - set(self.visited[-1:])
 
         # build constraints for target items
-        pre_visited_cnt = Sum(
-            [self.vars['count'][i] * If(cnf_formula(self.vars, self.cnfs[0], i, 'or'), 1, 0) for i in pre_visited_set])
-        last_visited_cnt = self.vars['count'][self.visited[-1]] * If(
-            cnf_formula(self.vars, self.cnfs[0], self.visited[-1]),
-            1, 0)
+        pre_visited_cnt = Sum([self.target_count(i) for i in pre_visited_set])
+        last_visited_cnt = self.target_count(self.visited[-1])
         pre_visited_cnt_less_than_total_cnt = pre_visited_cnt < self.total_cnt
         pre_plus_last_visited_equals_total_cnt = (pre_visited_cnt + last_visited_cnt) == self.total_cnt
 
@@ -29,9 +29,7 @@ class SumSMT(ObjectiveSMT):
         only_straw_allowed = cnf_formula(self.vars, [['noname', 'strawberry']], list(range(self.ntiles)), 'and')
 
         # put more target items
-        more_than_collected = Sum(
-            [self.vars['count'][i] * If(cnf_formula(self.vars, self.cnfs[0], i, 'or'), 1, 0) for i in
-             range(self.ntiles)]) > self.total_cnt
+        more_than_collected = Sum([self.target_count(i) for i in range(self.ntiles)]) > self.total_cnt
 
         # constrains
         C = [
@@ -43,6 +41,5 @@ class SumSMT(ObjectiveSMT):
         return And(C)
 
     def feasible_path(self, path):
-        FEASIBLE = Sum([self.vars['count'][i] * If(cnf_formula(self.vars, self.cnfs[0], i, 'or'), 1, 0)
-                        for i in set(path)]) == self.total_cnt
+        FEASIBLE = Sum([self.target_count(i) for i in set(path)]) == self.total_cnt
         return FEASIBLE
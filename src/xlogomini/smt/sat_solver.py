@@ -0,0 +1,246 @@
+import random
+import threading
+import time
+from src.xlogomini.utils.formulas import exactly_the_same
+from z3 import Goal, Tactic, Probe, OrElse, TryFor, Then, Bool, BoolVal, IntVal, BitVecVal, Or, Not
+from z3 import is_bool, is_int, is_bv, is_true, sat, unsat, unknown
+
+# z3 tactics that compile the world, goal and trace optimality formulas of a pworld to pure CNF:
+# cardinalities and pseudo-booleans to bit-vectors, enumerations to bits, then everything to clauses
+CNF_TACTICS = ('simplify', 'propagate-values', 'lia2card', 'card2bv', 'normalize-bounds', 'lia2pb', 'pb2bv',
+               'dt2bv', 'bit-blast', 'aig', 'tseitin-cnf')
+
+BOOL_VALUES = {False: BoolVal(False), True: BoolVal(True)}
+
+# possible values of the integer model variables (item counts)
+INT_DOMAIN = range(0, 5)
+
+
+def import_pysat():
+    try:
+        from pysat.solvers import Solver as PySatSolver
+    except ImportError:
+        raise ImportError("The SAT backend needs PySAT, install it with `pip install python-sat`.")
+    return PySatSolver
+
+
+def domain_values(var):
+    """
+    Return the possible values of a non-boolean model variable: an item count, an enumeration or a bit-vector.
+    """
+    if is_int(var):
+        return [IntVal(k) for k in INT_DOMAIN]
+    if is_bv(var):
+        return [BitVecVal(k, var.size()) for k in range(2 ** var.size())]
+    sort = var.sort()
+    return [sort.constructor(k)() for k in range(sort.num_constructors())]
+
+
+def parse_dimacs(dimacs):
+    """
+    Return the clauses of a DIMACS string of z3 and the {name: id} of its variables.
+    """
+    clauses, ids = [], {}
+    for line in dimacs.splitlines():
+        if line.startswith('c '):
+            _, id, name = line.split(' ', 2)
+            ids[name] = int(id)
+        elif line and not line.startswith('p '):
+            clauses.append([int(lit) for lit in line.split()[:-1]])
+    return clauses, ids
+
+
+class SatModel(object):
+    """
+    The values of the model variables in a model of the SAT solver, read by `model2values`.
+    """
+
+    def __init__(self, values):
+        self.values = values
+
+    def eval(self, var, model_completion=True):
+        return self.values[var.get_id()]
+
+
+class SatWorldSolver(object):
+    """
+    Drop-in for the z3 solver of a pworld in `Code2Tasks.pworld_to_worlds`, backed by an embedded SAT solver.
+
+    The assertions of the z3 solver are compiled to CNF once, at the first check, with `CNF_TACTICS`. Each
+    non-boolean model variable gets one channel boolean per value, so that its value is read from the SAT
+    model. The models are enumerated by blocking the literals of the boolean model variables and the channels.
+    The few model variables that the tactics fix or drop are completed once with z3 and kept.
+
+    With `random_phases`, each search starts from random values of the booleans, so that the models are spread
+    over the worlds. If the assertions do not reach pure CNF, the z3 solver is used instead. The assertions
+    tracked with `labels` hold in the CNF, and an unsat core is only asked from the z3 solver, when the pworld
+    has no world at all.
+    """
+
+    def __init__(self, solver, model_vars, labels=(), name='cadical153', random_phases=False):
+        self.solver = solver
+        self.vars = model_vars
+        self.model_vars = [var for vars in model_vars.values() for var in (vars if isinstance(vars, list) else [vars])]
+        self.labels = list(labels)
+        self.name = name
+        self.random_phases = random_phases
+        self.timeout = None
+        self.sat_solver = None
+        self.fallback = False
+        self.n_models = 0
+        self.last_block = None
+        self.z3_result = False  # whether the last result comes from z3
+
+    def set(self, key, value):
+        self.solver.set(key, value)
+        if key == 'timeout':
+            self.timeout = value / 1000
+
+    def add(self, formula):
+        if self.sat_solver is not None:
+            raise ValueError("Constraints cannot be added to a compiled SAT solver, use `block_model`.")
+        self.solver.add(formula)
+
+    def compile(self):
+        """
+        Compile the assertions to CNF and load them into the SAT solver. Return False if the
+        compilation did not reach pure CNF or ran out of time.
+        """
+        goal = Goal()
+        goal.add(self.solver.assertions())
+        # the tracked assertions are implied by their labels
+        goal.add([Bool(label) for label in self.labels])
+        # one channel per value of the non-boolean model variables
+        self.channels = {}
+        self.channel_defs = []
+        for var in self.model_vars:
+            if is_bool(var):
+                continue
+            values = domain_values(var)
+            channels = [Bool(f'{var}=={value}') for value in values]
+            goal.add(Or([var == value for value in values]))
+            self.channel_defs.extend([channel == (var == value) for channel, value in zip(channels, values)])
+            self.channels[var.get_id()] = list(zip(channels, values))
+        goal.add(self.channel_defs)
+
+        tactic = Then(*[OrElse(Tactic(name), Tactic('skip')) for name in CNF_TACTICS])
+        if self.timeout is not None:
+            tactic = TryFor(tactic, max(1, int(self.timeout * 1000)))
+        try:
+            subgoals = tactic(goal)
+        except Exception:
+            return False
+        if len(subgoals) != 1 or Probe('is-propositional')(subgoals[0]) != 1.0:
+            # not a pure CNF, e.g., with the arithmetic of the bit-vector counts of the compact item encodings
+            return False
+        clauses, self.ids = parse_dimacs(subgoals[0].dimacs())
+
+        PySatSolver = import_pysat()
+        self.sat_solver = PySatSolver(name=self.name, bootstrap_with=clauses)
+        # CaDiCaL cannot be interrupted at a timeout
+        self.interruptible = not self.name.startswith('cadical')
+        # booleans read from the SAT model, by their index: the boolean model variables, then the channels
+        self.bools = [var for var in self.model_vars if is_bool(var)] + \
+                     [channel for channels in self.channels.values() for channel, _ in channels]
+        self.bool_ids = [self.ids.get(str(var)) for var in self.bools]  # None if not in the CNF
+        index = {var.get_id(): k for k, var in enumerate(self.bools)}
+        self.decoders = [index[var.get_id()] if is_bool(var) else
+                         [(index[channel.get_id()], value) for channel, value in self.channels[var.get_id()]]
+                         for var in self.model_vars]
+        self.positions = {var.get_id(): k for k, var in enumerate(self.model_vars)}
+        self.fixed = None
+        return True
+
+    def check(self):
+        if self.sat_solver is None and not self.fallback:
+            self.fallback = not self.compile()
+        if self.fallback:
+            return self.solver.check()
+
+        if self.random_phases:
+            self.sat_solver.set_phases([id if random.random() < 0.5 else -id for id in self.bool_ids if id is not None])
+        if self.timeout is None or not self.interruptible:
+            # the deadlines are still checked between the models
+            result = self.sat_solver.solve()
+        else:
+            start = time.time()
+            timer = threading.Timer(self.timeout, self.sat_solver.interrupt)
+            timer.start()
+            result = self.sat_solver.solve_limited(expect_interrupt=True)
+            timer.cancel()
+            self.sat_solver.clear_interrupt()
+            self.timeout = max(0.001, self.timeout - (time.time() - start))
+
+        self.z3_result = False
+        if result is None:
+            return unknown
+        if not result:
+            if self.n_models == 0 and self.labels:
+                # for the unsat core
+                self.z3_result = True
+                return self.solver.check()
+            return unsat
+        if self.fixed is None:
+            self.assignment = set(self.sat_solver.get_model())
+            self.fixed = self.complete({self.bools[k]: id in self.assignment
+                                        for k, id in enumerate(self.bool_ids) if id is not None})
+            if self.fixed is None:
+                self.z3_result = True
+                return unknown
+        return sat
+
+    def reason_unknown(self):
+        if self.fallback or self.z3_result:
+            return self.solver.reason_unknown()
+        return 'timeout'
+
+    def unsat_core(self):
+        if self.fallback or self.z3_result:
+            return self.solver.unsat_core()
+        return []
+
+    def model(self):
+        if self.fallback:
+            return self.solver.model()
+
+        assignment = self.assignment if self.n_models == 0 else set(self.sat_solver.get_model())
+        bool_values = [id in assignment if id is not None else self.fixed[k] for k, id in enumerate(self.bool_ids)]
+
+        values = []
+        for decoder in self.decoders:
+            if isinstance(decoder, int):
+                values.append(BOOL_VALUES[bool_values[decoder]])
+            else:
+                values.append(next(value for k, value in decoder if bool_values[k]))
+
+        self.n_models += 1
+        self.last_block = [-id if bool_values[k] else id for k, id in enumerate(self.bool_ids) if id is not None]
+        return SatModel({id: values[k] for id, k in self.positions.items()})
+
+    def complete(self, bool_values):
+        """
+        Return {index: value} of the booleans that are not in the CNF, from a z3 model that agrees with `bool_values`,
+        or None if z3 gave up. The tactics only drop the booleans that are fixed or free, so their values are kept
+        for all the models.
+        """
+        assumptions = [var if value else Not(var) for var, value in bool_values.items()]
+        self.solver.push()
+        self.solver.add(self.channel_defs)
+        result = self.solver.check(*assumptions)
+        model = self.solver.model() if result == sat else None
+        self.solver.pop()
+        if result == unknown:
+            return None
+        if model is None:
+            raise RuntimeError("The CNF of the SAT backend disagrees with the z3 formulas.")
+        return {k: is_true(model.eval(self.bools[k], model_completion=True))
+                for k, id in enumerate(self.bool_ids) if id is None}
+
+    def block_model(self, model_values):
+        """
+        The next model cannot be exactly the same as the last one, with the given values.
+        """
+        if self.fallback:
+            self.solver.add(Not(exactly_the_same(self.vars, model_values)))
+        else:
+            self.sat_solver.add_clause(self.last_block)
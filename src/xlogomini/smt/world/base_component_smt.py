@@ -1,3 +1,35 @@
+import functools
+
+# formulas shared by the components of the same grid size and item encoding, see `grid_cached`
+_grid_formulas = {}
+
+
+def _hashable(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _hashable(v)) for k, v in value.items()))
+    return value
+
+
+def grid_cached(method):
+    """
+    Cache the formula of a method that only depends on the grid size, the item encoding and its
+    arguments. The variables are named after the tiles, so the components of the same grid build
+    the same z3 terms, and the formula is built (and simplified) once per process.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (type(self).__name__, method.__name__, self.rows, self.cols, getattr(self, 'encoding', None),
+               _hashable(args), _hashable(kwargs))
+        if key not in _grid_formulas:
+            _grid_formulas[key] = method(self, *args, **kwargs)
+        return _grid_formulas[key]
+
+    return wrapper
+
+
 class ComponentSMT():
     def __init__(self, rows, cols):
         self.rows = rows
@@ -6,6 +38,8 @@ class ComponentSMT():
 
         self.vars = {}
         self.var_names = self.vars.keys()
+        # the variables that define a model, `vars` may hold expressions over them instead
+        self.model_vars = self.vars
 
     def __getitem__(self, item):
         return self.vars[item]
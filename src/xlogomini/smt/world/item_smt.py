@@ -1,19 +1,52 @@
-from .base_component_smt import ComponentSMT
-from z3 import BoolVector, IntVector, AtMost, AtLeast, And, Or, Not, Implies
+from .base_component_smt import ComponentSMT, grid_cached
+from z3 import BoolVector, IntVector, AtMost, AtLeast, And, Or, Not, Implies, Const, BitVec, BitVecVal, BV2Int, ULT
 from src.xlogomini.utils.enums import *
 
 
 class ItemSMT(ComponentSMT):
-    def __init__(self, rows, cols):
+    def __init__(self, rows, cols, encoding='bool'):
+        """
+        The `encoding` of the name, color and count of the item at each tile:
+            - 'bool': a boolean per name and per color, and an integer for the count
+            - 'enum': an enumeration sort for the name and for the color, and a 3-bit vector for the count
+            - 'bitvec': small bit-vectors for the name, the color and the count
+        With 'enum' and 'bitvec', `self.vars` has the same keys as with 'bool', but as expressions over
+        the variables in `self.model_vars`, so that the formulas built on `self.vars` are unchanged.
+        """
         ComponentSMT.__init__(self, rows, cols)
-        # name
-        for v in NAME_VARS:
-            self.vars[v] = BoolVector(v, rows * cols)
-        # color
-        for v in COLOR_VARS:
-            self.vars[v] = BoolVector(v, rows * cols)
-        # count
-        self.vars['count'] = IntVector('count', rows * cols)
+        assert encoding in ITEM_ENCODINGS
+        self.encoding = encoding
+        if encoding == 'bool':
+            # name
+            for v in NAME_VARS:
+                self.vars[v] = BoolVector(v, rows * cols)
+            # color
+            for v in COLOR_VARS:
+                self.vars[v] = BoolVector(v, rows * cols)
+            # count
+            self.vars['count'] = IntVector('count', rows * cols)
+            return
+
+        if encoding == 'enum':
+            sorts = z3_sorts()
+            names = [Const(f'item_name__{i}', sorts['ItemName']) for i in range(rows * cols)]
+            colors = [Const(f'item_color__{i}', sorts['ItemColor']) for i in range(rows * cols)]
+            name_values, color_values = sorts['ITEM_NAMES'], sorts['ITEM_COLORS']
+        else:
+            NAME_BITS, COLOR_BITS = (len(NAME_LIST) - 1).bit_length(), (len(COLOR_LIST) - 1).bit_length()
+            names = [BitVec(f'item_name__{i}', NAME_BITS) for i in range(rows * cols)]
+            colors = [BitVec(f'item_color__{i}', COLOR_BITS) for i in range(rows * cols)]
+            name_values = [BitVecVal(k, NAME_BITS) for k in range(len(NAME_LIST))]
+            color_values = [BitVecVal(k, COLOR_BITS) for k in range(len(COLOR_LIST))]
+        COUNT_BITS = max(COUNT_VARS).bit_length()
+        counts = [BitVec(f'item_count__{i}', COUNT_BITS) for i in range(rows * cols)]
+
+        self.model_vars = {'item_name': names, 'item_color': colors, 'item_count': counts}
+        for v, value in zip(NAME_LIST, name_values):
+            self.vars[v] = [name == value for name in names]
+        for v, value in zip(COLOR_LIST, color_values):
+            self.vars[v] = [color == value for color in colors]
+        self.vars['count'] = [BV2Int(count) for count in counts]
 
     def set_empty(self):
         return And(
@@ -22,6 +55,7 @@ class ItemSMT(ComponentSMT):
             And([self.vars['count'][i] == 0 for i in range(len(self.vars['count']))])
         )
 
+    @grid_cached
     def properties(self,
                    colors_straw=('red',),
                    colors_lemon=('yellow',),
@@ -55,11 +89,14 @@ class ItemSMT(ComponentSMT):
     def properties_for_name(self):
         C = []
         for i in range(self.ntiles):
-            name_list = [self.vars[name][i] for name in NAME_VARS]  # [x_i_strawberry, x_i_lemon, ...]
-            # exactly one of the names can be true
+            if self.encoding == 'bool':
+                name_list = [self.vars[name][i] for name in NAME_VARS]  # [x_i_strawberry, x_i_lemon, ...]
+                # exactly one of the names can be true
+                C.extend([AtLeast(*name_list, 1), AtMost(*name_list, 1)])
+            elif self.encoding == 'bitvec':
+                # the compact encodings have exactly one name, but a bit-vector can be out of the names
+                C.append(ULT(self.model_vars['item_name'][i], len(NAME_LIST)))
             C.extend([
-                AtLeast(*name_list, 1),
-                AtMost(*name_list, 1),
                 # noname <=> nocolor <=> count=0
                 self.vars['nocolor'][i] == self.vars['noname'][i],
                 self.vars['noname'][i] == (self.vars['count'][i] == 0)
@@ -100,9 +137,12 @@ class ItemSMT(ComponentSMT):
         C = []
         for i in range(self.ntiles):
             # general constraints for items
-            clr_list = [self.vars[color][i] for color in COLOR_VARS]  # [x_i_red, x_i_blue, ...]
-            # exactly one of the colors can be true
-            C.extend([AtLeast(*clr_list, 1), AtMost(*clr_list, 1)])
+            if self.encoding == 'bool':
+                clr_list = [self.vars[color][i] for color in COLOR_VARS]  # [x_i_red, x_i_blue, ...]
+                # exactly one of the colors can be true
+                C.extend([AtLeast(*clr_list, 1), AtMost(*clr_list, 1)])
+            elif self.encoding == 'bitvec':
+                C.append(ULT(self.model_vars['item_color'][i], len(COLOR_LIST)))
 
             # colors for strawberry
             C.append(Implies(self.vars['strawberry'][i],
@@ -1,8 +1,7 @@
 from src.xlogomini.smt.world.base_component_smt import *
 from z3 import And, Or, BoolVector, Const, is_bool, is_const, eq, Implies, Not
 from src.xlogomini.utils.helpers import get_neighboring_ids, i2yx
-from src.xlogomini.utils.enums import MarkerColor
-from src.xlogomini.utils.enums import nocolor
+from src.xlogomini.utils.enums import z3_sorts
 
 
 class MarkerSMT(ComponentSMT):
@@ -13,6 +12,7 @@ class MarkerSMT(ComponentSMT):
         self.vars['rightM'] = BoolVector('rightM', rows * cols)
         self.vars['bottomM'] = BoolVector('bottomM', rows * cols)
 
+        MarkerColor = z3_sorts()['MarkerColor']
         self.vars['topM_color'] = [Const(f'topM_color__{i}', MarkerColor) for i in range(rows * cols)]
         self.vars['leftM_color'] = [Const(f'leftM_color__{i}', MarkerColor) for i in range(rows * cols)]
         self.vars['rightM_color'] = [Const(f'rightM_color__{i}', MarkerColor) for i in range(rows * cols)]
@@ -26,7 +26,9 @@ class MarkerSMT(ComponentSMT):
             Not(Or(self.vars['bottomM']))
         )
 
+    @grid_cached
     def properties(self):
+        nocolor = z3_sorts()['MARKER_COLORS']['nocolor']
         C = []
         # have marker -> marker color != none
         for i in range(self.rows * self.cols):
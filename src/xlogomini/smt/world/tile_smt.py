@@ -1,4 +1,4 @@
-from src.xlogomini.smt.world.base_component_smt import ComponentSMT
+from src.xlogomini.smt.world.base_component_smt import ComponentSMT, grid_cached
 from z3 import BoolVector, And, Not, Or, Implies, Bool
 from src.xlogomini.utils.helpers import yx2i
 from src.xlogomini.utils.helpers import right_tile_id, bottom_tile_id, get_edges, get_neighboring_ids
@@ -15,6 +15,7 @@ class TileSMT(ComponentSMT):
         self.vars['allowed'] = BoolVector('allowed', self.ntiles)
         self.vars['exist'] = BoolVector('exist', self.ntiles)
 
+    @grid_cached
     def properties(self, symmetric=True):
         C = [
             self.properties_for_adjacent_walls(),
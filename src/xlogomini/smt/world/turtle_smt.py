@@ -1,4 +1,4 @@
-from .base_component_smt import ComponentSMT
+from .base_component_smt import ComponentSMT, grid_cached
 from z3 import BoolVector, And
 from src.xlogomini.utils.formulas import exactly_one
 from src.xlogomini.utils.enums import DEG_MAP
@@ -12,6 +12,7 @@ class TurtleSMT(ComponentSMT):
         # dir
         self.vars['dir'] = BoolVector('dir', len(DEG_MAP))
 
+    @grid_cached
     def properties(self):
         C = [
             # exactly one turtle
@@ -5,27 +5,44 @@ from src.xlogomini.utils.helpers import yx2i, get_neighboring_ids
 from src.xlogomini.smt.world.item_smt import ItemSMT
 from src.xlogomini.smt.world.tile_smt import TileSMT
 from src.xlogomini.smt.world.marker_smt import MarkerSMT
+from src.xlogomini.smt.world.base_component_smt import grid_cached
 from src.xlogomini.smt.world.turtle_smt import TurtleSMT
 from src.xlogomini.utils.formulas import exactly_one
 import math
 
 
 class WorldSMT():
-    def __init__(self, rows, cols):
+    def __init__(self, rows, cols, item_encoding='bool'):
+        """
+        `item_encoding` is the encoding of the items, one of `ITEM_ENCODINGS` (see `ItemSMT`).
+        """
         self.rows = rows
         self.cols = cols
         self.ntiles = self.rows * self.cols
+        self.encoding = item_encoding  # part of the key of the formulas cached by `grid_cached`
 
         self.turtle_smt = TurtleSMT(self.rows, self.cols)
-        self.item_smt = ItemSMT(self.rows, self.cols)
+        self.item_smt = ItemSMT(self.rows, self.cols, encoding=item_encoding)
         self.tile_smt = TileSMT(self.rows, self.cols)
         self.marker_smt = MarkerSMT(self.rows, self.cols)
 
         self.vars = self._build_vars()
+        # the variables of a model, to read the worlds and block them
+        self.model_vars = self.turtle_smt.model_vars | self.item_smt.model_vars | self.tile_smt.model_vars | \
+                          self.marker_smt.model_vars
 
     def _build_vars(self):
         return self.turtle_smt.vars | self.item_smt.vars | self.tile_smt.vars | self.marker_smt.vars
 
+    def sampling_vars(self):
+        """
+        Return the booleans of the names and colors of the items, the forbidden tiles and the walls,
+        on which the worlds are told apart in the diverse sampling.
+        """
+        names = sorted(NAME_VARS) + sorted(ITEM_COLOR) + ['allowed', 'topW', 'rightW', 'bottomW', 'leftW']
+        return [var for name in names for var in self.vars[name]]
+
+    @grid_cached
     def pworld_indep_properties(self,
                                 colors_straw,
                                 colors_lemon,
@@ -69,6 +86,7 @@ class WorldSMT():
 
         return simplify(And(C))
 
+    @grid_cached
     def _properties_between_turtle_and_tiles(self):
         C = []
         for i in range(self.ntiles):
@@ -88,11 +106,13 @@ class WorldSMT():
             ])
         return And(C)
 
+    @grid_cached
     def _properties_between_turtle_and_items(self):
         # turtle at (x,y) -> no items at (x,y)
         C = [Implies(self.turtle_smt['turtle'][i], self.item_smt['noname'][i]) for i in range(self.ntiles)]
         return And(C)
 
+    @grid_cached
     def _properties_between_tiles_and_items(self):
         C = []
         for i in range(self.ntiles):
@@ -110,6 +130,7 @@ class WorldSMT():
         return And(C)
 
     def properties_for_pworld(self, pworld, marker_world):
+        MARKER_COLORS = z3_sorts()['MARKER_COLORS']
         C = []
 
         turtle = pworld.init_turtle
@@ -180,6 +201,20 @@ class WorldSMT():
 
         return And(C)
 
+    def properties_for_value_precedence(self, values):
+        """
+        Break the symmetry of interchangeable item names or colors `values`: each value can only be at
+        a tile after the first tile of the previous value, so that only one world is kept for all the
+        permutations of the values.
+        """
+        C = []
+        for prev, value in zip(values, values[1:]):
+            prev_before = False  # `prev` at a tile before i
+            for i in range(self.ntiles):
+                C.append(Implies(self.item_smt[value][i], prev_before))
+                prev_before = Or(prev_before, self.item_smt[prev][i])
+        return And(C)
+
     def _properties_for_sim_items(self, ref_world):
         """
         1. Same type of items
@@ -344,6 +379,7 @@ class WorldSMT():
         ]
         return And(C)
 
+    @grid_cached
     def properties_for_marker_world(self):
         """
         Return constraints that only apply to marker world.
@@ -1,14 +1,22 @@
 from z3 import *
-from tqdm import tqdm
-from itertools import islice
-import numpy as np
 from src.xlogomini.utils.graph import build_empty_world_graph
 from src.xlogomini.utils.formulas import wall_vars_along_the_path, exactly_one
-import networkx as nx
 import os
 
 
+# constraints loaded or calculated in this process, by (rows, cols, k_shortest_paths)
+_reachability_cache = {}
+
+
 def properties_for_reachability(vars, rows, cols, k_shortest_paths=100):
+    # the variables are named after the tiles, so the constraints only depend on the grid size
+    key = (rows, cols, k_shortest_paths)
+    if key not in _reachability_cache:
+        _reachability_cache[key] = _properties_for_reachability(vars, rows, cols, k_shortest_paths)
+    return _reachability_cache[key]
+
+
+def _properties_for_reachability(vars, rows, cols, k_shortest_paths):
     # load the constraints from file
     file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
                              f'./reachability_{rows}x{cols}_{k_shortest_paths}.smt2')
@@ -18,6 +26,12 @@ def properties_for_reachability(vars, rows, cols, k_shortest_paths=100):
             z3_cons = parse_smt2_string(f.read())
             return And(z3_cons)
 
+    # only needed to calculate the constraints, which are usually loaded from file
+    from tqdm import tqdm
+    from itertools import islice
+    import numpy as np
+    import networkx as nx
+
     def k_shortest_simple_paths(G, source, target, k, weight=None):
         return list(islice(nx.shortest_simple_paths(G, source, target, weight=weight), k))
 
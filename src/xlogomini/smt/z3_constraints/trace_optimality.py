@@ -92,6 +92,13 @@ def properties_for_optimal_trace(vars, rows, cols, visited, init_dir, feasible_p
     shorter_paths_walls = []
     n_actions_visited, _, _ = n_actions_for_path(rows, cols, visited, init_dir=init_dir)
 
+    standalone_walls = {}  # id of the wall variable -> `is_standalone_wall`, built once per wall
+
+    def standalone_wall(wall):
+        if wall.get_id() not in standalone_walls:
+            standalone_walls[wall.get_id()] = is_standalone_wall(vars, rows, cols, str(wall))
+        return standalone_walls[wall.get_id()]
+
     # shorter_paths = []
 
     def generate_shorter_paths(start, max_actions, prev_path, cur_dir, code_constraints):
@@ -134,7 +141,7 @@ def properties_for_optimal_trace(vars, rows, cols, visited, init_dir, feasible_p
                     # 1) path cannot solve the task (forbidden items included)
                     # 2) walls in the path
                     PATH_IS_FEASIBLE = feasible_path_func(merged_path)
-                    SL_WALLS_IN_PATH = Or([is_standalone_wall(vars, rows, cols, str(wall)) for wall in path_walls])
+                    SL_WALLS_IN_PATH = Or([standalone_wall(wall) for wall in path_walls])
                     C.append(And([
                         # Implies(Not(PATH_IS_FEASIBLE), Not(SL_WALLS_IN_PATH)),
                         Implies(PATH_IS_FEASIBLE, SL_WALLS_IN_PATH)]
@@ -154,11 +161,11 @@ def properties_for_optimal_trace(vars, rows, cols, visited, init_dir, feasible_p
 
     # don't allow non-shortest paths to have standalone walls
     all_walls = vars['leftW'] + vars['rightW'] + vars['topW'] + vars['bottomW']
-    allowed_walls = shorter_paths_walls + wall_vars_along_the_path(vars, rows, cols, visited)
-    disallowed_walls = [x for x in all_walls if x not in allowed_walls]
+    allowed_walls = {wall.get_id() for wall in
+                     shorter_paths_walls + wall_vars_along_the_path(vars, rows, cols, visited)}
+    disallowed_walls = [x for x in all_walls if x.get_id() not in allowed_walls]
 
-    NO_SA_WALLS_IN_NON_SHORTEST_PATHS = And(
-        [Not(is_standalone_wall(vars, rows, cols, str(wall))) for wall in disallowed_walls])
+    NO_SA_WALLS_IN_NON_SHORTEST_PATHS = And([Not(standalone_wall(wall)) for wall in disallowed_walls])
     C.append(NO_SA_WALLS_IN_NON_SHORTEST_PATHS)
 
     return And(C)
@@ -1,10 +1,11 @@
 import copy
-from sympy.logic.boolalg import to_dnf, to_cnf, simplify_logic
-from sympy import symbols
-from sympy.logic.boolalg import And as S_And, Or as S_Or, Not as S_Not
+
+# sympy is slow to import, so it is only imported by the functions that use it
 
 
 def sym2nf(sym, from_nf, _to_cnf=None):
+    from sympy.logic.boolalg import to_dnf, to_cnf
+
     def _sym2nf(sym, _to_cnf=None):
         if _to_cnf == True:
             sym = to_cnf(sym)
@@ -45,6 +46,8 @@ def sym2nf(sym, from_nf, _to_cnf=None):
 
 
 def nf2sym(nf, from_cnf=True, to_cnf_sym=True):
+    from sympy import symbols
+    from sympy.logic.boolalg import to_dnf, to_cnf, And as S_And, Or as S_Or
     syms = {}
     for c in nf:
         for l in c:
@@ -72,6 +75,7 @@ def dnf2cnf(dnf):
 
 
 def not_cnf(cnf):
+    from sympy.logic.boolalg import to_cnf
     cnf = copy.deepcopy(cnf)
     for i in range(len(cnf)):
         cnf[i].append('noname')
@@ -1,6 +1,6 @@
-from src.xlogomini.utils.graph import build_world_graph, build_empty_world_graph
+from src.xlogomini.utils.graph import build_world_adjacency
+from src.xlogomini.utils.grid import all_shortest_paths
 from src.xlogomini.utils.helpers import get_neighboring_ids
-import networkx as nx
 
 
 def min_actions_for_dst(world, src, dst):
@@ -11,9 +11,9 @@ def min_actions_for_dst(world, src, dst):
     rows, cols = world.rows, world.cols
 
     # compare the trace with the shortest paths
-    G = build_world_graph(world)  # build the graph for this world
+    adjacency = build_world_adjacency(world)  # the moves in this world
     basic_actions_each_sp = [n_actions_for_path(rows, cols, sp, world.turtle.dir)[0]
-                             for sp in nx.all_shortest_paths(G, source=src, target=dst)]
+                             for sp in all_shortest_paths(adjacency, source=src, target=dst)]
     return min(basic_actions_each_sp)
 
 
@@ -1,4 +1,4 @@
-from z3 import EnumSort
+from functools import lru_cache
 
 MATRIX_DIMENSIONS = 4
 MAX_API_CALLS = 1e5
@@ -129,6 +129,14 @@ NAME_VARS = ITEM_FRUIT.union(ITEM_CHAR).union(ITEM_SHAPE).union({'noname'})  # n
 FRUIT_VARS = ITEM_FRUIT  # fruit
 SHAPE_VARS = ITEM_SHAPE  # shape
 CHAR_VARS = ITEM_CHAR  # char
+# compact encodings of the items, see `ItemSMT`
+ITEM_ENCODINGS = ('bool', 'enum', 'bitvec')
+# solvers of the worlds of a pworld, see `SatWorldSolver`
+SOLVER_BACKENDS = ('z3', 'sat')
+# worlds enumerated for a pworld, see `Code2Tasks.hashed_check`
+SAMPLING_MODES = ('first', 'diverse')
+NAME_LIST = sorted(NAME_VARS)  # values of the name, by index for 'bitvec'
+COLOR_LIST = sorted(COLOR_VARS)  # values of the color, by index for 'bitvec'
 # vars for turtle
 TURTLE_POS_VARS = {'turtle'}
 TURTLE_DIR_VARS = {'north', 'south', 'east', 'west'}
@@ -136,14 +144,24 @@ TURTLE_DIR_VARS = {'north', 'south', 'east', 'west'}
 TILE_VARS = {'allowed', 'top', 'right', 'bottom', 'left'}
 
 # vars for marker color
-MarkerColor, (red, green, blue, black, white, yellow, nocolor) = EnumSort('MarkerColor', (
-    'red', 'green', 'blue', 'black', 'white', 'yellow', 'nocolor'))
-MARKER_COLORS = {
-    'red'    : red,
-    'green'  : green,
-    'blue'   : blue,
-    'black'  : black,
-    'white'  : white,
-    'yellow' : yellow,
-    'nocolor': nocolor
-}
+MARKER_COLOR_LIST = ['red', 'green', 'blue', 'black', 'white', 'yellow', 'nocolor']
+
+
+@lru_cache(maxsize=None)
+def z3_sorts():
+    """
+    Return the z3 enumeration sorts of the item names, item colors and marker colors, with their values. They are
+    declared at the first call, so that the emulator does not import z3.
+    """
+    from z3 import EnumSort
+    ItemName, item_names = EnumSort('ItemName', NAME_LIST)
+    ItemColor, item_colors = EnumSort('ItemColor', COLOR_LIST)
+    MarkerColor, marker_colors = EnumSort('MarkerColor', MARKER_COLOR_LIST)
+    return {
+        'ItemName'     : ItemName,
+        'ItemColor'    : ItemColor,
+        'MarkerColor'  : MarkerColor,
+        'ITEM_NAMES'   : item_names,
+        'ITEM_COLORS'  : item_colors,
+        'MARKER_COLORS': dict(zip(MARKER_COLOR_LIST, marker_colors)),
+    }
@@ -1,4 +1,6 @@
-from z3 import And, Or, simplify, AtLeast, AtMost, Not
+import random
+from functools import reduce
+from z3 import And, Or, simplify, AtLeast, AtMost, Not, Xor, BoolVal
 from src.xlogomini.utils.enums import *
 from src.xlogomini.utils.helpers import get_neighboring_ids
 
@@ -19,6 +21,19 @@ def Equals(var_list):
     return constr
 
 
+def random_xors(bits, n_xors, density=0.5):
+    """
+    Return `n_xors` random parity constraints over the booleans `bits`, each on a random subset of
+    them (every bit with probability `density`). They split the models into about 2^n_xors cells
+    of the same size, and the models of one cell are a near-uniform sample (as in UniGen).
+    """
+    C = []
+    for _ in range(n_xors):
+        subset = [bit for bit in bits if random.random() < density] or [random.choice(bits)]
+        C.append(reduce(Xor, subset) == BoolVal(random.random() < 0.5))
+    return And(C)
+
+
 def exactly_the_same(A, B):
     C = []
     for k in A.keys():
@@ -41,9 +56,27 @@ def model2values(vars, model):
     return model_values
 
 
+# simplified formulas of a cnf at a location, see `loc_formula`
+_loc_formulas = {}
+
+
+def loc_formula(vars, cnf, loc):
+    """
+    Return the simplified formula of the cnf at the location, built once per process. The z3 term
+    of `noname` at the location is part of the key, since it differs across the item encodings,
+    and the cache keeps it alive so that its id is not reused.
+    """
+    key = (vars['noname'][loc].get_id(), tuple(tuple(clause) for clause in cnf), loc)
+    if key not in _loc_formulas:
+        _loc_formulas[key] = (vars['noname'][loc], simplify(And([clause_formula(vars, clause, loc)
+                                                                 for clause in cnf])))
+    return _loc_formulas[key][1]
+
+
 def cnf_formula(vars, cnf, locs, operator='or', n=None):
     """
-    Return the SMT formula for the given locations.
+    Return the SMT formula for the given locations. The formulas at the locations are
+    simplified once (see `loc_formula`), and left to the solver to simplify together.
 
     Examples
     --------
@@ -54,29 +87,26 @@ def cnf_formula(vars, cnf, locs, operator='or', n=None):
        And(Or(x_2_red, x_2_blue), Not(x_2_lemon), x_2_orange))
     """
     locs = [locs] if isinstance(locs, int) else locs
-    loc_list = []
-    for loc in locs:
-        and_list = []
-        for clause in cnf:
-            and_list.append(clause_formula(vars, clause, loc))
-        loc_list.append(And(and_list))
+    loc_list = [loc_formula(vars, cnf, loc) for loc in locs]
 
+    if operator in ['or', 'and'] and len(loc_list) == 1:
+        return loc_list[0]
     if operator == 'or':
-        return simplify(Or(loc_list))
+        return Or(loc_list)
     elif operator == 'and':
-        return simplify(And(loc_list))
+        return And(loc_list)
     elif operator == 'exactly_one':
-        return simplify(exactly_one(loc_list))
+        return exactly_one(loc_list)
     elif operator == 'at_least':
         assert n is not None
-        return simplify(AtLeast(*loc_list, n))
+        return AtLeast(*loc_list, n)
     else:
         raise ValueError(f"{operator} not recognized")
 
 
 def clause_formula(vars, clause, loc):
     """
-    Return the SMT formula for the given clause at the location.
+    Return the SMT formula for the given clause at the location, simplified by the caller.
 
     Examples:
     --------
@@ -105,7 +135,7 @@ def clause_formula(vars, clause, loc):
             else:
                 or_list.append(vars[l][loc])
 
-    return simplify(Or(or_list))
+    return Or(or_list)
 
 
 def wall_vars_along_the_path(vars, rows, cols, path):
@@ -1,10 +1,63 @@
-from src.xlogomini.components.goal.goal_edit_distance import cal_tree_distance_for_goal
-import numpy as np
-from src.xlogomini.components.goal.goal import Goal
+from src.xlogomini.components.goal.goal_edit_distance import cal_tree_distance_for_goal, cal_node_distance_for_goal
+from src.xlogomini.components.goal.goal_edit_distance import parse_goal
+from src.xlogomini.utils.metric_index import BKTree, tree_labels, bag_distance
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
+import heapq
 
 
-def get_goal_set_cover(goals):
+def is_sum_goal(goal_json):
+    return goal_json[0]['name'] == 'sum'
+
+
+class GoalTrees(object):
+    """
+    The goals parsed into trees once, with a BK-tree over the label multisets of the non-sum goals.
+    The bag distance lower bounds the tree edit distance, so a range query gives the candidates
+    to verify with zss.
+    """
+
+    def __init__(self, goals):
+        self.goals = goals
+        self.trees = [None if is_sum_goal(goal) else parse_goal(goal) for goal in goals]
+        # goal index of each item in the BK-tree
+        self.tree_ids = [i for i, tree in enumerate(self.trees) if tree is not None]
+        self.labels = [tree_labels(tree) if tree is not None else None for tree in self.trees]
+        self.index = BKTree(bag_distance, [self.labels[i] for i in self.tree_ids])
+
+    def covered_pairs(self, rows, distance_threshold):
+        """
+        Return (i, j) for all i in `rows` and j != i such that goal i covers goal j,
+        i.e., their distance is within `distance_threshold`. Only j > i is verified with zss.
+        """
+        pairs = []
+        for i in rows:
+            if self.trees[i] is None:
+                # the distance for `sum` is cheap but not symmetric, compare with all the goals
+                pairs.extend([(i, j) for j in range(len(self.goals)) if j != i and
+                              cal_tree_distance_for_goal(self.goals[i], self.goals[j]) <= distance_threshold])
+                continue
+
+            for idx, _ in self.index.range_query(self.labels[i], distance_threshold):
+                j = self.tree_ids[idx]
+                if j > i and cal_node_distance_for_goal(self.trees[i], self.trees[j]) <= distance_threshold:
+                    pairs.extend([(i, j), (j, i)])
+        return pairs
+
+
+_worker_goal_trees = None
+
+
+def _init_worker(goal_trees):
+    global _worker_goal_trees
+    _worker_goal_trees = goal_trees
+
+
+def _covered_pairs_in_worker(rows, distance_threshold):
+    return _worker_goal_trees.covered_pairs(rows, distance_threshold)
+
+
+def get_goal_set_cover(goals, max_workers=1):
     # >300: 2, >50: 1, <50: 0.5
     if len(goals) > 300:
         distance_threshold = 2
@@ -13,29 +66,40 @@ def get_goal_set_cover(goals):
     else:
         distance_threshold = 0.5
 
-    # Step 1: Calculate Distance Matrix
-    distance_matrix = np.zeros((len(goals), len(goals)))
-    # use tqdm
-    for i in tqdm(range(len(goals)), desc="Calculating distance matrix"):
-        for j in range(len(goals)):
-            if i != j:
-                distance_matrix[i][j] = cal_tree_distance_for_goal(goals[i], goals[j])
-
-    # Step 2: Define Set Cover Problem
+    # Step 1: Find the pairs within the distance threshold
     # Here, each goal can "cover" goals that are within the distance threshold
-    can_cover = [{j for j in range(len(goals)) if distance_matrix[i][j] <= distance_threshold} for i in
-                 range(len(goals))]
+    can_cover = [{i} for i in range(len(goals))]
+    # parsing also sorts the specs of the goals in place, as `cal_tree_distance_for_goal` did
+    goal_trees = GoalTrees(goals)  # builds the BK-tree once, shared with the workers
+    if max_workers > 1:
+        # rows are interleaved across the chunks to balance the load
+        n_chunks = max_workers * 4
+        chunks = [range(k, len(goals), n_chunks) for k in range(n_chunks)]
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(goal_trees,)) as executor:
+            futures = [executor.submit(_covered_pairs_in_worker, rows, distance_threshold) for rows in chunks]
+            for future in tqdm(futures, desc="Calculating distance matrix"):
+                for i, j in future.result():
+                    can_cover[i].add(j)
+    else:
+        for i in tqdm(range(len(goals)), desc="Calculating distance matrix"):
+            for i_, j in goal_trees.covered_pairs([i], distance_threshold):
+                can_cover[i_].add(j)
 
-    # Step 3: Implement Greedy Set Cover Algorithm
+    # Step 2: Greedy Set Cover with a lazy priority queue
+    # The gain of a goal never increases, so a stale gain is an upper bound. Ties go to the smaller index.
     uncovered = set(range(len(goals)))
     selected_goals = []
-    selected_goals_str = set()
+    queue = [(-len(cover), i) for i, cover in enumerate(can_cover)]
+    heapq.heapify(queue)
 
     while uncovered:
-        # Select the goal that covers the most uncovered goals
-        goal = max(can_cover, key=lambda s: len(s & uncovered))
-        uncovered -= goal
-        selected_goals.append(goals[can_cover.index(goal)])
-        selected_goals_str.add(Goal.init_from_json(goals[can_cover.index(goal)]))
+        neg_gain, i = heapq.heappop(queue)
+        gain = len(can_cover[i] & uncovered)
+        if gain == -neg_gain:
+            # Select the goal that covers the most uncovered goals
+            uncovered -= can_cover[i]
+            selected_goals.append(goals[i])
+        else:
+            heapq.heappush(queue, (-gain, i))
 
-    return selected_goals
\ No newline at end of file
+    return selected_goals
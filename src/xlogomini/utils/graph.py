@@ -1,8 +1,15 @@
-import networkx as nx
+from functools import lru_cache
 from src.xlogomini.utils.helpers import i2yx, i2y, i2x
+from src.xlogomini.utils.grid import manhattan_shortest_paths
 
 
+@lru_cache(maxsize=None)
 def build_empty_world_graph(rows, cols):
+    """
+    Return the graph of the empty grid, built once per grid size and shared, so the callers must not modify it.
+    Only needed for the algorithms of networkx, see `grid` for the neighbors and the shortest paths.
+    """
+    import networkx as nx
     nodes_and_edges = {}
     ntiles = rows * cols
 
@@ -18,7 +25,10 @@ def build_empty_world_graph(rows, cols):
     return nx.Graph(nodes_and_edges)
 
 
-def build_world_graph(world):
+def world_nodes_and_edges(world):
+    """
+    Return {tile: the tiles reachable in one move} of the world, the edges of `build_world_graph`.
+    """
     tiles = world.tiles
     rows, cols = world.rows, world.cols
     ntiles = rows * cols
@@ -59,11 +69,29 @@ def build_world_graph(world):
             if (j >= 0) and (j < ntiles) and (abs(y_i - y_j) + abs(x_i - x_j) <= 1) and \
                     (tiles[y_j, x_j].allowed) and (not tiles[y_j, x_j].wall_right):
                 nodes_and_edges[i].append(j)
+    return nodes_and_edges
 
-    return nx.Graph(nodes_and_edges)
+
+def build_world_graph(world):
+    import networkx as nx
+    return nx.Graph(world_nodes_and_edges(world))
+
+
+def build_world_adjacency(world):
+    """
+    Return the ids of the neighbors of each tile of the world, with the same (undirected) edges as
+    `build_world_graph`, for the functions of `grid`.
+    """
+    adjacency = [set() for _ in range(world.rows * world.cols)]
+    for i, neighbors in world_nodes_and_edges(world).items():
+        for j in neighbors:
+            adjacency[i].add(j)
+            adjacency[j].add(i)
+    return [sorted(neighbors) for neighbors in adjacency]
 
 
 def build_visit_graph(visited):
+    import networkx as nx
     G = nx.Graph()
     for i in range(len(visited) - 1):
         G.add_edge(visited[i], visited[i + 1])
@@ -74,9 +102,8 @@ def get_the_closest_shortest_path(rows, cols, visited):
     """
     Return the shortest path that is the closest with the trace and other shortest paths.
     """
-    graph = build_empty_world_graph(rows, cols)
     # a list of all shortest paths
-    shortest_paths = list(nx.all_shortest_paths(graph, source=visited[0], target=visited[-1]))
+    shortest_paths = manhattan_shortest_paths(cols, source=visited[0], target=visited[-1])
     visited_set = set(visited)
 
     # init
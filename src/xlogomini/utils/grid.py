@@ -0,0 +1,101 @@
+from collections import deque
+from functools import lru_cache
+from itertools import combinations
+from math import comb
+
+
+@lru_cache(maxsize=None)
+def neighbor_table(rows, cols):
+    """
+    Return the {'top', 'left', 'right', 'bottom'} ids of the neighbors of each tile, None outside the grid,
+    built once per grid size and shared, so the callers must not modify them.
+    """
+    table = []
+    for i in range(rows * cols):
+        y, x = i // cols, i % cols
+        table.append({
+            "top"   : i - cols if y > 0 else None,
+            "left"  : i - 1 if x > 0 else None,
+            "right" : i + 1 if x < cols - 1 else None,
+            "bottom": i + cols if y < rows - 1 else None
+        })
+    return tuple(table)
+
+
+def bfs_distances(adjacency, source):
+    """
+    Return the number of moves from `source` to each tile in the graph given by `adjacency` (a list of the ids of the
+    neighbors of each tile), -1 for the tiles that cannot be reached.
+    """
+    dist = [-1] * len(adjacency)
+    dist[source] = 0
+    queue = deque([source])
+    while queue:
+        i = queue.popleft()
+        for j in adjacency[i]:
+            if dist[j] < 0:
+                dist[j] = dist[i] + 1
+                queue.append(j)
+    return dist
+
+
+def all_shortest_paths(adjacency, source, target):
+    """
+    Return all the shortest paths from `source` to `target` in the graph given by `adjacency`, like
+    `nx.all_shortest_paths` but in another order. Return [] if `target` cannot be reached.
+    """
+    dist = bfs_distances(adjacency, source)
+    if dist[target] < 0:
+        return []
+
+    paths = []
+
+    def backtrack(path):
+        # walk back from the target, one move closer to the source at each step
+        i = path[-1]
+        if i == source:
+            paths.append(path[::-1])
+            return
+        for j in adjacency[i]:
+            if dist[j] == dist[i] - 1:
+                backtrack(path + [j])
+
+    backtrack([target])
+    return paths
+
+
+def manhattan_shortest_paths(cols, source, target):
+    """
+    Return all the shortest paths from `source` to `target` in an empty grid, in closed form: the orders of
+    the vertical and horizontal moves between them.
+    """
+    (y0, x0), (y1, x1) = divmod(source, cols), divmod(target, cols)
+    n_moves = abs(y1 - y0) + abs(x1 - x0)
+    step_y, step_x = cols if y1 > y0 else -cols, 1 if x1 > x0 else -1
+
+    paths = []
+    for moves_y in combinations(range(n_moves), abs(y1 - y0)):
+        path = [source]
+        moves_y = set(moves_y)
+        for k in range(n_moves):
+            path.append(path[-1] + (step_y if k in moves_y else step_x))
+        paths.append(path)
+    return paths
+
+
+def n_manhattan_shortest_paths(cols, source, target):
+    """
+    Return the number of shortest paths from `source` to `target` in an empty grid.
+    """
+    (y0, x0), (y1, x1) = divmod(source, cols), divmod(target, cols)
+    return comb(abs(y1 - y0) + abs(x1 - x0), abs(y1 - y0))
+
+
+def shortest_path_tiles(cols, source, target):
+    """
+    Return the tiles on the shortest paths between two tiles of an empty grid: the tiles of the rectangle
+    spanned by them, the same as the union of `manhattan_shortest_paths`.
+    """
+    (y0, x0), (y1, x1) = divmod(source, cols), divmod(target, cols)
+    return {y * cols + x for y in range(min(y0, y1), max(y0, y1) + 1)
+            for x in range(min(x0, x1), max(x0, x1) + 1)}
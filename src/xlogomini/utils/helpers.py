@@ -1,3 +1,6 @@
+from src.xlogomini.utils.grid import neighbor_table
+
+
 def yx2i(y, x, cols):
     """
     Convert (y,x) to the index of the world (starting from 0).
@@ -68,14 +71,10 @@ def bottom_tile_id(i, rows, cols):
 def get_neighboring_ids(i, rows, cols):
     """
     Return the ids for neighboring tiles of tile `i` in the order: top, left, right, bottom.
+    The ids are precomputed per grid size (see `neighbor_table`), so the callers must not modify them.
     """
-    neighbors_ids = {
-        "top"   : top_tile_id(i, rows, cols),
-        "left"  : left_tile_id(i, rows, cols),
-        "right" : right_tile_id(i, rows, cols),
-        "bottom": bottom_tile_id(i, rows, cols)
-    }
-    return neighbors_ids
+    assert i >= 0 and i < rows * cols
+    return neighbor_table(rows, cols)[i]
 
 
 def get_edges(rows, cols):
@@ -1,10 +1,15 @@
 import base64
 import io
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from src.xlogomini.components.code.xlogo_code import Code
 from PIL import Image, ImageDraw, ImageFont
 from src.xlogomini.utils.enums import *
 import os
 
+IMAGES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../assets/images')
+CELL_SIZE = 100  # size of a tile in pixels, the size of the icons in `IMAGES_PATH`
+
 
 def text2image(text, show=False, save=True, filename=None):
     # Create a drawing context
@@ -42,87 +47,85 @@ def text2image(text, show=False, save=True, filename=None):
         image.save(filename, "PNG", quality=50)
 
 
-def task2image(task_json, show=False, save=True, filename=None, show_desc=False, return_base64=False):
-    rows = max([tile['y'] for tile in task_json['tiles']]) + 1
-    cols = max([tile['x'] for tile in task_json['tiles']]) + 1
-    cell_size = 100
-
-    res_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../assets/images')
-
-    # Create an empty image
-    image = Image.new('RGBA', (cols * (cell_size + 1), rows * (cell_size + 1)), 'white')
-    draw = ImageDraw.Draw(image)
-
-    def plot_tiles():
-        for tile in task_json['tiles']:
-            x = tile['x']
-            y = tile['y']
-
-            x0 = x * cell_size
-            y0 = y * cell_size
-
-            if 'exist' in tile.keys() and not tile['exist']:
-                continue
-
-            if not tile['allowed']:
-                draw.rectangle((x0, y0, x0 + cell_size, y0 + cell_size), fill="grey")
-
-            if 'top' in tile['walls'].keys() and tile['walls']['top']:
-                draw.line((x0, y0, x0 + cell_size, y0), fill=(0, 0, 0), width=8)
-            if 'left' in tile['walls'].keys() and tile['walls']['left']:
-                draw.line((x0, y0, x0, y0 + cell_size), fill=(0, 0, 0), width=8)
-            if 'right' in tile['walls'].keys() and tile['walls']['right']:
-                draw.line((x0 + cell_size, y0, x0 + cell_size, y0 + cell_size), fill=(0, 0, 0), width=8)
-            if 'bottom' in tile['walls'].keys() and tile['walls']['bottom']:
-                draw.line((x0, y0 + cell_size, x0 + cell_size, y0 + cell_size), fill=(0, 0, 0), width=8)
-
-            draw.line((x0, y0, x0 + cell_size, y0), fill=(0, 0, 0), width=1)
-            draw.line((x0, y0, x0, y0 + cell_size), fill=(0, 0, 0), width=1)
-            draw.line((x0 + cell_size, y0, x0 + cell_size, y0 + cell_size), fill=(0, 0, 0), width=1)
-            draw.line((x0, y0 + cell_size, x0 + cell_size, y0 + cell_size), fill=(0, 0, 0), width=1)
-
-    def plot_turtle():
-        turtle = task_json['turtle']
-        turtle_img = Image.open(os.path.join(res_path, f"turtle{turtle['direction'] * 90}.png")).convert('RGBA')
-        turtle_draw_pos = (int((task_json['turtle']['x'] + 0.5) * cell_size - turtle_img.width / 2),
-                           int((task_json['turtle']['y'] + 0.5) * cell_size - turtle_img.height / 2))
-        image.paste(turtle_img, turtle_draw_pos, mask=turtle_img)
-
-    def plot_items():
-        for item in task_json["items"]:
-            x = item["x"]
-            y = item["y"]
-
-            if item['name'] == 'strawberry':
-                if item['count'] == 1:
-                    item_img = Image.open(os.path.join(res_path, "strawberry.png")).convert('RGBA')
-                else:
-                    item_img = Image.open(os.path.join(res_path, f"{item['count']}strawberry.png")).convert('RGBA')
-            elif item['name'] == 'lemon':
-                item_img = Image.open(os.path.join(res_path, f"lemon.png")).convert('RGBA')
-            elif item['name'] in ITEM_SHAPE:
-                item_img = Image.open(os.path.join(res_path, f"{item['name']}-{item['color']}.png")).convert(
-                    'RGBA')
-            else:
-                raise ValueError(f"{item['name']} not recognized!")
-
-            item_draw_pos = (
-                int((item["x"] + 0.5) * cell_size - item_img.width // 2),
-                int((item["y"] + 0.5) * cell_size - item_img.height // 2),
-            )
-            image.paste(item_img, item_draw_pos, mask=item_img.split()[3])
-
-    def plot_lines():
-        for line in task_json["lines"]:
+class TaskRenderer(object):
+    """
+    Render the worlds of the tasks as `task2image`, from sprites loaded and scaled once: the icons of the items
+    and the turtle, and the tiles drawn once per variant (allowed, walls) and pasted at their positions.
+    With the default `cell_size`, the images are the same as drawing the tiles one by one.
+    """
+
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.scale = cell_size / CELL_SIZE
+        self.wall_width = max(1, round(8 * self.scale))
+        self.pad = self.wall_width // 2 + 1  # the walls overflow the tiles
+        self.sprites = {}
+        self.tile_sprites = {}
+        for filename in sorted(os.listdir(IMAGES_PATH)):
+            self.sprite(filename)
+
+    def sprite(self, filename):
+        """
+        Return the icon of the file in the images assets, scaled to the cell size.
+        """
+        if filename not in self.sprites:
+            sprite = Image.open(os.path.join(IMAGES_PATH, filename)).convert('RGBA')
+            if self.scale != 1:
+                sprite = sprite.resize((max(1, round(sprite.width * self.scale)),
+                                        max(1, round(sprite.height * self.scale))))
+            self.sprites[filename] = (sprite, sprite.split()[3])
+        return self.sprites[filename]
+
+    def tile_sprite(self, allowed, walls):
+        """
+        Return the tile with the given walls ('top', 'left', 'right', 'bottom'), with its grey fill if not
+        `allowed`, and its border. The pixels around the tile hold the overflow of the walls.
+        """
+        key = (allowed, walls)
+        if key not in self.tile_sprites:
+            cell_size, pad = self.cell_size, self.pad
+            sprite = Image.new('RGBA', (cell_size + 1 + 2 * pad, cell_size + 1 + 2 * pad), (0, 0, 0, 0))
+            draw = ImageDraw.Draw(sprite)
+            x0, y0, x1, y1 = pad, pad, pad + cell_size, pad + cell_size
+            if not allowed:
+                draw.rectangle((x0, y0, x1, y1), fill="grey")
+            wall_lines = {'top'   : (x0, y0, x1, y0),
+                          'left'  : (x0, y0, x0, y1),
+                          'right' : (x1, y0, x1, y1),
+                          'bottom': (x0, y1, x1, y1)}
+            for position in ['top', 'left', 'right', 'bottom']:
+                if position in walls:
+                    draw.line(wall_lines[position], fill=(0, 0, 0), width=self.wall_width)
+            for position in ['top', 'left', 'right', 'bottom']:
+                draw.line(wall_lines[position], fill=(0, 0, 0), width=1)
+            self.tile_sprites[key] = (sprite, sprite.split()[3])
+        return self.tile_sprites[key]
+
+    def item_filename(self, item):
+        if item['name'] == 'strawberry':
+            return "strawberry.png" if item['count'] == 1 else f"{item['count']}strawberry.png"
+        elif item['name'] == 'lemon':
+            return "lemon.png"
+        elif item['name'] in ITEM_SHAPE:
+            return f"{item['name']}-{item['color']}.png"
+        raise ValueError(f"{item['name']} not recognized!")
+
+    def paste_centered(self, image, filename, x, y):
+        sprite, mask = self.sprite(filename)
+        image.paste(sprite, (int((x + 0.5) * self.cell_size - sprite.width // 2),
+                             int((y + 0.5) * self.cell_size - sprite.height // 2)), mask=mask)
+
+    def draw_lines(self, draw, lines):
+        cell_size = self.cell_size
+        width = max(1, round(3 * self.scale))
+        dash_length = 10 * self.scale  # length of each dash
+        dash_gap = 5 * self.scale  # length of gap between dashes
+        for line in lines:
             # Define line coordinates and color
             x1 = (line['x1'] + 0.5) * cell_size
             y1 = (line['y1'] + 0.5) * cell_size
             x2 = (line['x2'] + 0.5) * cell_size
             y2 = (line['y2'] + 0.5) * cell_size
-            color = line['color']
-            width = 3
-            dash_length = 10  # length of each dash
-            dash_gap = 5  # length of gap between dashes
 
             # Calculate line length and direction
             dx = x2 - x1
@@ -135,130 +138,207 @@ def task2image(task_json, show=False, save=True, filename=None, show_desc=False,
             while dash_pos < line_length:
                 # Calculate start and end points of dash
                 dash_start = (x1 + line_direction[0] * dash_pos, y1 + line_direction[1] * dash_pos)
-                dash_end_pos = dash_pos + dash_length
-                if dash_end_pos > line_length:
-                    dash_end_pos = line_length
+                dash_end_pos = min(dash_pos + dash_length, line_length)
                 dash_end = (x1 + line_direction[0] * dash_end_pos, y1 + line_direction[1] * dash_end_pos)
+                draw.line((dash_start, dash_end), fill=line['color'], width=width)
+                dash_pos += dash_length + dash_gap
 
-                # Draw dash
-                draw.line((dash_start, dash_end), fill=color, width=width)
+    def render(self, task_json, show_desc=False):
+        """
+        Return the image of the task, with its description on top if `show_desc`.
+        """
+        rows = max([tile['y'] for tile in task_json['tiles']]) + 1
+        cols = max([tile['x'] for tile in task_json['tiles']]) + 1
+        cell_size = self.cell_size
 
-                # Update dash position
-                dash_pos += dash_length + dash_gap
+        image = Image.new('RGBA', (cols * (cell_size + 1), rows * (cell_size + 1)), 'white')
+        for tile in task_json['tiles']:
+            if 'exist' in tile.keys() and not tile['exist']:
+                continue
+            walls = tuple(position for position in ['top', 'left', 'right', 'bottom'] if tile['walls'].get(position))
+            sprite, mask = self.tile_sprite(tile['allowed'], walls)
+            image.paste(sprite, (tile['x'] * cell_size - self.pad, tile['y'] * cell_size - self.pad), mask=mask)
+        for item in task_json["items"]:
+            self.paste_centered(image, self.item_filename(item), item['x'], item['y'])
+        self.draw_lines(ImageDraw.Draw(image), task_json["lines"])
+        turtle = task_json['turtle']
+        self.paste_centered(image, f"turtle{turtle['direction'] * 90}.png", turtle['x'], turtle['y'])
+
+        if show_desc:
+            image = plot_task_desc(world_image=image, text=f"{task_json['description']}")
+        return image
+
+    def render_batch(self, task_jsons, save_dir=None, filenames=None, show_desc=False, max_workers=1):
+        """
+        Render many tasks. Save them in `save_dir` (as `filenames`, or 0.png, 1.png, ...) and return their paths,
+        or return their PNGs encoded in base64 if `save_dir` is None. With `max_workers` > 1, the tasks are
+        rendered by a pool of processes, each with its own renderer.
+        """
+        if save_dir is not None:
+            os.makedirs(save_dir, exist_ok=True)
+            filenames = filenames or [f"{k}.png" for k in range(len(task_jsons))]
+            paths = [os.path.join(save_dir, filename) for filename in filenames]
+        else:
+            paths = [None] * len(task_jsons)
+
+        args = [(task_json, path, show_desc) for task_json, path in zip(task_jsons, paths)]
+        if max_workers > 1:
+            # a few chunks per worker to balance the load
+            chunksize = max(1, len(args) // (max_workers * 4))
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker_renderer,
+                                     initargs=(self.cell_size,)) as executor:
+                return list(executor.map(_render_in_worker, args, chunksize=chunksize))
+        return [self.render_to(*arg) for arg in args]
+
+    def render_to(self, task_json, path=None, show_desc=False):
+        """
+        Save the image of the task at `path` and return the path, or return the base64 of its PNG if `path` is None.
+        """
+        image = self.render(task_json, show_desc=show_desc)
+        if path is not None:
+            image.save(path, "PNG", quality=50)
+            return path
+        return image2base64(image)
+
+
+_worker_renderer = None
+
+
+def _init_worker_renderer(cell_size):
+    global _worker_renderer
+    _worker_renderer = TaskRenderer(cell_size)
+
+
+def _render_in_worker(args):
+    return _worker_renderer.render_to(*args)
+
+
+@lru_cache(maxsize=None)
+def default_renderer():
+    """
+    Return the renderer of `task2image`, created at the first call in each process.
+    """
+    return TaskRenderer()
+
+
+@lru_cache(maxsize=None)
+def load_font(size):
+    try:
+        # local font
+        return ImageFont.truetype(font='Arial.ttf', size=size)
+    except:
+        # font for remote server
+        return ImageFont.truetype(font="/usr/share/fonts/truetype/dejavu/DejaVuSerif.ttf", size=size)
 
-    def plot_task_desc(world_image, text):
-        width, height = world_image.size
 
-        # Define padding values
-        padding_top = 50
-        padding_bottom = 10
-        padding_left = 80
-        padding_right = 80
+def image2base64(image):
+    # Convert the image to a base64 encoded string
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode('utf-8')
 
-        # Increase the font size
-        font_size = 20
-        max_line_length = 40  # Adjusted for the larger font size
 
-        try:
-            # local font
-            font = ImageFont.truetype(font='Arial.ttf', size=font_size)
-        except:
-            # font for remote server
-            font = ImageFont.truetype(font="/usr/share/fonts/truetype/dejavu/DejaVuSerif.ttf", size=font_size)
+def plot_task_desc(world_image, text):
+    width, height = world_image.size
 
-        # Split the text into multiple lines
-        lines = []
-        line = ''
-        for word in text.split():
-            if len(line) + len(word) + 1 > max_line_length:
-                lines.append(line)
-                line = ''
-            line += ' ' + word
-        lines.append(line)
+    # Define padding values
+    padding_top = 50
+    padding_bottom = 10
+    padding_left = 80
+    padding_right = 80
 
-        # Calculate the total height required for the text
-        total_text_height = sum([font.getsize(line)[1] for line in lines]) + 10 * (
-                len(lines) - 1)  # 10 pixels padding between lines
+    # Increase the font size
+    font_size = 20
+    max_line_length = 40  # Adjusted for the larger font size
 
-        new_width = width + padding_left + padding_right
-        new_height = height + total_text_height + 20 + padding_top + padding_bottom  # 20 pixels padding for text
+    font = load_font(font_size)
 
-        new_image = Image.new('RGB', (new_width, new_height), color=(255, 255, 255))
+    # Split the text into multiple lines
+    lines = []
+    line = ''
+    for word in text.split():
+        if len(line) + len(word) + 1 > max_line_length:
+            lines.append(line)
+            line = ''
+        line += ' ' + word
+    lines.append(line)
 
-        # paste the original image on the new image with padding offsets
-        offset_y = padding_top + total_text_height + 20
-        offset_x = padding_left
-        new_image.paste(world_image, (offset_x, offset_y))
+    # Calculate the total height required for the text
+    total_text_height = sum([font.getsize(line)[1] for line in lines]) + 10 * (
+            len(lines) - 1)  # 10 pixels padding between lines
 
-        # add the text above the image
-        draw = ImageDraw.Draw(new_image)
+    new_width = width + padding_left + padding_right
+    new_height = height + total_text_height + 20 + padding_top + padding_bottom  # 20 pixels padding for text
 
-        text_y = padding_top + 10  # placing text above the image with extra 10 pixels padding
+    new_image = Image.new('RGB', (new_width, new_height), color=(255, 255, 255))
 
-        for line in lines:
-            text_width, text_height = draw.textsize(line, font=font)
-            text_x = (new_width - text_width) // 2
-            draw.text((text_x, text_y), line.strip(), font=font, fill=(0, 0, 0))
-            text_y += text_height + 10  # 10 pixels padding between lines
+    # paste the original image on the new image with padding offsets
+    offset_y = padding_top + total_text_height + 20
+    offset_x = padding_left
+    new_image.paste(world_image, (offset_x, offset_y))
 
-        return new_image
+    # add the text above the image
+    draw = ImageDraw.Draw(new_image)
 
-    def plot_task_desc3(world_image, text):
-        width, height = world_image.size
+    text_y = padding_top + 10  # placing text above the image with extra 10 pixels padding
 
-        # Increase the font size
-        font_size = 20
-        max_line_length = 40  # Adjusted for the larger font size
+    for line in lines:
+        text_width, text_height = draw.textsize(line, font=font)
+        text_x = (new_width - text_width) // 2
+        draw.text((text_x, text_y), line.strip(), font=font, fill=(0, 0, 0))
+        text_y += text_height + 10  # 10 pixels padding between lines
 
-        try:
-            # local font
-            font = ImageFont.truetype(font='Arial.ttf', size=font_size)
-        except:
-            # font for remote server
-            font = ImageFont.truetype(font="/usr/share/fonts/truetype/dejavu/DejaVuSerif.ttf", size=font_size)
+    return new_image
 
-        # Split the text into multiple lines
-        lines = []
-        line = ''
-        for word in text.split():
-            if len(line) + len(word) + 1 > max_line_length:
-                lines.append(line)
-                line = ''
-            line += ' ' + word
-        lines.append(line)
 
-        # Calculate the total height required for the text
-        total_text_height = sum([font.getsize(line)[1] for line in lines]) + 10 * (
-                len(lines) - 1)  # 10 pixels padding between lines
+def plot_task_desc3(world_image, text):
+    width, height = world_image.size
 
-        new_width = width
-        new_height = height + total_text_height + 20  # 20 pixels padding
+    # Increase the font size
+    font_size = 20
+    max_line_length = 40  # Adjusted for the larger font size
 
-        new_image = Image.new('RGB', (new_width, new_height), color=(255, 255, 255))
+    font = load_font(font_size)
 
-        # paste the original image on the new image
-        offset_y = (new_height - world_image.height)
-        new_image.paste(world_image, (0, offset_y))
+    # Split the text into multiple lines
+    lines = []
+    line = ''
+    for word in text.split():
+        if len(line) + len(word) + 1 > max_line_length:
+            lines.append(line)
+            line = ''
+        line += ' ' + word
+    lines.append(line)
 
-        # add the text above the image
-        draw = ImageDraw.Draw(new_image)
+    # Calculate the total height required for the text
+    total_text_height = sum([font.getsize(line)[1] for line in lines]) + 10 * (
+            len(lines) - 1)  # 10 pixels padding between lines
 
-        text_y = 10  # placing text above the image with extra 10 pixels padding
+    new_width = width
+    new_height = height + total_text_height + 20  # 20 pixels padding
 
-        for line in lines:
-            text_width, text_height = draw.textsize(line, font=font)
-            text_x = (new_width - text_width) // 2
-            draw.text((text_x, text_y), line.strip(), font=font, fill=(0, 0, 0))
-            text_y += text_height + 10  # 10 pixels padding between lines
+    new_image = Image.new('RGB', (new_width, new_height), color=(255, 255, 255))
 
-        return new_image
+    # paste the original image on the new image
+    offset_y = (new_height - world_image.height)
+    new_image.paste(world_image, (0, offset_y))
+
+    # add the text above the image
+    draw = ImageDraw.Draw(new_image)
+
+    text_y = 10  # placing text above the image with extra 10 pixels padding
+
+    for line in lines:
+        text_width, text_height = draw.textsize(line, font=font)
+        text_x = (new_width - text_width) // 2
+        draw.text((text_x, text_y), line.strip(), font=font, fill=(0, 0, 0))
+        text_y += text_height + 10  # 10 pixels padding between lines
+
+    return new_image
 
-    plot_tiles()
-    plot_items()
-    plot_lines()
-    plot_turtle()
-    if show_desc:
-        image = plot_task_desc(world_image=image, text=f"{task_json['description']}")
+
+def task2image(task_json, show=False, save=True, filename=None, show_desc=False, return_base64=False):
+    image = default_renderer().render(task_json, show_desc=show_desc)
 
     if show:
         image.show()
@@ -269,11 +349,7 @@ def task2image(task_json, show=False, save=True, filename=None, show_desc=False,
         image.save(filename, "PNG", quality=50)
 
     if return_base64:
-        # Convert the image to a base64 encoded string
-        buffer = io.BytesIO()
-        image.save(buffer, format='PNG')
-        base64_image = base64.b64encode(buffer.getvalue()).decode('utf-8')
-        return base64_image
+        return image2base64(image)
     return image
 
 
@@ -1,33 +1,47 @@
+from functools import lru_cache
 import json
 import os
 
+# asset name -> (file in the assets folder, key of the json in each task)
+ASSET_FILES = {
+    'code'       : ('xlogomini_codes.json', 'code_json'),
+    'constraints': ('xlogomini_constraints.json', 'constraints'),
+    'goal'       : ('xlogomini_goals.json', 'goal'),
+    'world'      : ('xlogomini_worlds.json', 'world_json'),
+}
 
-def load_code_json(task_id):
+
+@lru_cache(maxsize=None)
+def load_asset_file(asset):
+    """
+    Parse the asset file once per process and return {task_id: json}.
+    """
     base_path = os.path.dirname(os.path.abspath(__file__))
-    code_file = open(os.path.join(base_path, '../assets/xlogomini_codes.json'), 'r')
-    code_json = json.load(code_file)[task_id]['code_json']
-    return code_json
+    filename, key = ASSET_FILES[asset]
+    with open(os.path.join(base_path, '../assets', filename), 'r') as f:
+        return {task_id: task[key] for task_id, task in json.load(f).items()}
+
+
+@lru_cache(maxsize=None)
+def _load_asset_str(asset, task_id):
+    # the json of a task is kept serialized, since the callers are free to modify what they load
+    return json.dumps(load_asset_file(asset)[task_id])
+
+
+def load_code_json(task_id):
+    return json.loads(_load_asset_str('code', task_id))
 
 
 def load_cons_json(task_id):
-    base_path = os.path.dirname(os.path.abspath(__file__))
-    cons_file = open(os.path.join(base_path, '../assets/xlogomini_constraints.json'), 'r')
-    cons_json = json.load(cons_file)[task_id]['constraints']
-    return cons_json
+    return json.loads(_load_asset_str('constraints', task_id))
 
 
 def load_goal_json(task_id):
-    base_path = os.path.dirname(os.path.abspath(__file__))
-    goal_file = open(os.path.join(base_path, '../assets/xlogomini_goals.json'), 'r')
-    goal_json = json.load(goal_file)[task_id]['goal']
-    return goal_json
+    return json.loads(_load_asset_str('goal', task_id))
 
 
 def load_world_json(task_id):
-    base_path = os.path.dirname(os.path.abspath(__file__))
-    world_file = open(os.path.join(base_path, '../assets/xlogomini_worlds.json'), 'r')
-    world_json = json.load(world_file)[task_id]['world_json']
-    return world_json
+    return json.loads(_load_asset_str('world', task_id))
 
 
 def load_task_json(task_id):
@@ -38,3 +52,19 @@ def load_task_json(task_id):
     task_json.update(world_json)
     task_json.update({"goal": goal_json, "constraints": cons_json})
     return task_json
+
+
+def load_task_ids():
+    """
+    Return the ids of the reference tasks that have all the assets, in the order of the worlds file.
+    """
+    return [task_id for task_id in load_asset_file('world').keys()
+            if all(task_id in load_asset_file(asset) for asset in ASSET_FILES.keys())]
+
+
+def iter_tasks(task_ids=None):
+    """
+    Yield (task_id, task_json, code_json) for the given reference tasks, all of them by default.
+    """
+    for task_id in (load_task_ids() if task_ids is None else task_ids):
+        yield task_id, load_task_json(task_id), load_code_json(task_id)
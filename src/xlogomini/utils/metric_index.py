@@ -0,0 +1,110 @@
+from collections import Counter
+import heapq
+
+
+def tree_labels(tree):
+    """
+    Return the multiset of the node labels of a tree parsed by `parse_code` or `parse_goal`.
+    """
+    labels = Counter()
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        labels[node.label] += 1
+        stack.extend(node.children)
+    return labels
+
+
+def bag_distance(labels1, labels2):
+    """
+    Bag distance between two label multisets, a metric that lower bounds the tree edit distance
+    with unit costs: every node beyond the largest common label multiset has to be inserted,
+    removed or updated.
+    """
+    return max(sum(labels1.values()), sum(labels2.values())) - sum((labels1 & labels2).values())
+
+
+class BKTree(object):
+    """
+    Burkhard-Keller tree over items with an integer-valued metric, e.g., the zss tree edit
+    distance with unit costs (`cal_node_distance`, `cal_node_distance_for_goal`).
+
+    Each node keeps its children by their distance to the node, so by the triangle inequality
+    a query within `radius` of `item` only descends into the children whose distance to the
+    node is in [d - radius, d + radius], where d is the distance from `item` to the node.
+
+    If the exact distance is expensive, the tree can be built over a cheaper metric that lower
+    bounds it (e.g., `bag_distance`), so that a range query returns candidates to verify.
+    """
+
+    def __init__(self, distance, items=()):
+        self.distance = distance
+        self.items = []
+        self.root = None  # [index of the item, {distance: child node}]
+        for item in items:
+            self.add(item)
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, item):
+        """
+        Add `item` and return its index in `self.items`.
+        """
+        idx = len(self.items)
+        self.items.append(item)
+        if self.root is None:
+            self.root = [idx, {}]
+            return idx
+
+        node = self.root
+        while True:
+            d = self.distance(item, self.items[node[0]])
+            if d not in node[1]:
+                node[1][d] = [idx, {}]
+                return idx
+            node = node[1][d]
+
+    def range_query(self, item, radius):
+        """
+        Return the list of (index, distance) of all items within `radius` of `item`.
+        """
+        results = []
+        if self.root is None:
+            return results
+
+        stack = [self.root]
+        while stack:
+            idx, children = stack.pop()
+            d = self.distance(item, self.items[idx])
+            if d <= radius:
+                results.append((idx, d))
+            for d_child, child in children.items():
+                if d - radius <= d_child <= d + radius:
+                    stack.append(child)
+        return results
+
+    def knn_query(self, item, k):
+        """
+        Return the list of (index, distance) of the `k` nearest items to `item`, closest first.
+        Ties are broken by the index.
+        """
+        if self.root is None or k <= 0:
+            return []
+
+        nearest = []  # max-heap of (-distance, -index)
+        # visit the nodes in the order of their lower bound of the distance to `item`
+        queue = [(0, self.root[0], self.root)]
+        while queue:
+            bound, _, (idx, children) = heapq.heappop(queue)
+            if len(nearest) == k and bound > -nearest[0][0]:
+                break
+            d = self.distance(item, self.items[idx])
+            if len(nearest) < k:
+                heapq.heappush(nearest, (-d, -idx))
+            elif (-d, -idx) > nearest[0]:
+                heapq.heapreplace(nearest, (-d, -idx))
+            for d_child, child in children.items():
+                heapq.heappush(queue, (max(bound, abs(d - d_child)), child[0], child))
+
+        return sorted([(-idx, -d) for d, idx in nearest], key=lambda x: (x[1], x[0]))
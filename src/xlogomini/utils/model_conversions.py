@@ -2,7 +2,7 @@ from src.xlogomini.components.world.marker import MarkerArray, Marker
 from src.xlogomini.components.world.world import World
 from z3 import *
 from src.xlogomini.utils.helpers import i2yx, i2x, i2y
-from src.xlogomini.utils.enums import NAME_VARS, COLOR_VARS
+from src.xlogomini.utils.enums import NAME_VARS, COLOR_VARS, NAME_LIST, COLOR_LIST
 
 
 def model2values(vars, model):
@@ -15,6 +15,13 @@ def model2values(vars, model):
     return model_values
 
 
+def compact_item_value(value, values):
+    """
+    Return the name or color of a compact item variable: an enumeration constant, or an index in `values`.
+    """
+    return values[value.as_long()] if is_bv_value(value) else str(value)
+
+
 def values2world(rows, cols, model_values):
     """
     Convert the xlogo_smt model to the world representation (smt_model is an interpretation that makes each asserted constraint true).
@@ -38,7 +45,19 @@ def values2world(rows, cols, model_values):
             }
         })
 
-        if not is_true(model_values['noname'][i]):
+        if 'item_name' in model_values.keys():
+            # compact encoding of the items (see `ItemSMT`), either enumeration sorts or bit-vectors
+            name = compact_item_value(model_values['item_name'][i], NAME_LIST)
+            color = compact_item_value(model_values['item_color'][i], COLOR_LIST)
+            if name != 'noname':
+                items.append({
+                    "name" : name,
+                    "x"    : i2x(i, cols),
+                    "y"    : i2y(i, cols),
+                    "count": model_values['item_count'][i].as_long(),
+                    "color": color
+                })
+        elif not is_true(model_values['noname'][i]):
             for v in NAME_VARS:
                 if is_true(model_values[v][i]):
                     name = v
@@ -0,0 +1,49 @@
+from functools import lru_cache
+import zss
+
+
+def tree_key(node):
+    """
+    Return a canonical, hashable key of a tree parsed by `parse_code` or `parse_goal`:
+    (label, (key of child 1, key of child 2, ...)). Structurally identical trees have equal keys.
+    """
+    return node.label, tuple(tree_key(child) for child in node.children)
+
+
+@lru_cache(maxsize=2 ** 16)
+def key_distance(key1, key2):
+    """
+    Tree edit distance with unit costs between two trees given by their keys. The keys are
+    trees themselves, so zss runs on them directly.
+    """
+
+    def insert_cost(key):
+        # return the cost of inserting the given node
+        return 1
+
+    def remove_cost(key):
+        # return the cost of removing the given node
+        return 1
+
+    def update_cost(key1, key2):
+        # return the cost of updating node1 to node2
+        return 0 if key1[0] == key2[0] else 1
+
+    return zss.distance(key1, key2,
+                        get_children=lambda key: key[1],
+                        insert_cost=insert_cost,
+                        remove_cost=remove_cost,
+                        update_cost=update_cost)
+
+
+def cached_tree_distance(node1, node2):
+    """
+    Tree edit distance with unit costs between two parsed trees, memoized in a bounded LRU.
+    The distance is symmetric, so the cache is keyed by the unordered pair of tree keys.
+    """
+    key1, key2 = tree_key(node1), tree_key(node2)
+    if key1 == key2:
+        return 0
+    if key2 < key1:
+        key1, key2 = key2, key1
+    return key_distance(key1, key2)
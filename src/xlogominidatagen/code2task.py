@@ -7,27 +7,99 @@ from src.xlogominidatagen.symexecution.symbolic_executor import SymExecutor
 from src.xlogomini.smt.goal.goal_smt import GoalSMT
 from src.xlogomini.smt.goal.draw_smt import DrawSMT
 from src.xlogomini.smt.world.world_smt import WorldSMT
+from src.xlogomini.smt.sat_solver import SatWorldSolver
 from src.xlogomini.components.goal.goal import Goal
 from src.xlogomini.utils.load_data import load_code_json, load_goal_json, load_world_json
 from src.xlogomini.components.code.xlogo_code import Code
 from src.xlogomini.utils.model_conversions import model2values, values2world
-from src.xlogomini.utils.formulas import exactly_the_same
+from src.xlogomini.utils.formulas import exactly_the_same, random_xors
 from src.xlogomini.utils.load_data import load_code_json, load_cons_json
-from src.xlogomini.utils.enums import DEG_MAP
-from src.xlogomini.utils.image_conversions import task2image
+from src.xlogomini.utils.enums import DEG_MAP, ITEM_ENCODINGS, SOLVER_BACKENDS, SAMPLING_MODES, ITEM_COLOR
+from src.xlogomini.utils.enums import FRUIT_VARS, SHAPE_VARS, CHAR_VARS
 from src.xlogomini.smt.z3_constraints.trace_optimality import redundant_setpc_in_code
 from src.xlogomini.smt.z3_constraints.trace_optimality import properties_for_optimal_trace
-from z3 import Solver, sat, Not
+from z3 import Solver, sat, unsat, unknown, Not, And, BoolVal
 import argparse
 
 
+# colors of each item name in the synthesized worlds
+ITEM_COLORS = {
+    'strawberry': ['red'],
+    'lemon'     : ['yellow'],
+    'triangle'  : ['red', 'green', 'blue'],
+    'rectangle' : ['red', 'green', 'blue'],
+    'cross'     : ['red', 'green', 'blue'],
+    'circle'    : ['red', 'green', 'blue', 'yellow', 'orange', 'pink', 'purple', 'black'],
+    **{char: ['black'] for char in sorted(CHAR_VARS)},
+}
+
+# number of random parity constraints of the first check of a pworld, in the diverse sampling
+MAX_XORS = 8
+
+
+def interchangeable_values(ref_world, goal, pworld):
+    """
+    Return the groups of item names and of item colors that can be permuted in the worlds synthesized
+    for `ref_world` without changing whether they solve `goal`: the values of a group are allowed for
+    the same items (e.g., the same colors for each name), and are neither in the goal, nor in the pworld,
+    nor in the reference world. Worlds that only differ by such a permutation are equivalent for the goal,
+    e.g., the colors for a goal on shapes only. The values of the reference world are kept out of the groups,
+    since the scores compare the names and colors with the reference cell by cell.
+    """
+    if ref_world.markers_used:
+        return []
+
+    # the values fixed by the goal, by the pworld or by the reference world
+    fixed = {literal.lstrip('-') for objs in goal.objs.values() for obj in objs for spec in obj.specs
+             for clause in spec.cnf for literal in clause}
+    for items in [pworld.items, ref_world.items]:
+        fixed.update({value for item in items.flatten() if item is not None for value in [item.name, item.color]})
+
+    # colors of the names allowed in the worlds, see `WorldSMT._properties_for_sim_items`
+    types = {name: 'fruit' for name in FRUIT_VARS} | {name: 'shape' for name in SHAPE_VARS} | \
+            {name: 'char' for name in CHAR_VARS}
+    name_colors = {name: frozenset(colors) for name, colors in ITEM_COLORS.items()
+                   if types[name] in ref_world.itemtypes_used}
+    if 'circle' in name_colors and len(ref_world.shapes_used) >= 3:
+        name_colors['circle'] = frozenset(['red', 'green', 'blue'])
+
+    name_groups, color_groups = {}, {}
+    for name, colors in name_colors.items():
+        if name not in fixed:
+            name_groups.setdefault((types[name], colors), []).append(name)
+    for color in sorted(ITEM_COLOR - fixed):
+        names = frozenset(name for name, colors in name_colors.items() if color in colors)
+        if names:
+            color_groups.setdefault(names, []).append(color)
+    return [sorted(group) for group in list(name_groups.values()) + list(color_groups.values()) if len(group) >= 2]
+
+
+def earliest_deadline(deadlines):
+    """
+    Return the (reason, deadline) of the earliest deadline in {reason: deadline}, or (None, None).
+    """
+    if not deadlines:
+        return None, None
+    return min(deadlines.items(), key=lambda x: x[1])
+
+
 class Code2Tasks():
-    def __init__(self, rows, cols, ref_world_js, symmetric):
+    def __init__(self, rows, cols, ref_world_js, symmetric, item_encoding='bool', solver_backend='z3',
+                 symmetry_breaking=False, sampling='first', world_smt=None):
         self.rows = rows
         self.cols = cols
+        self.solver_backend = solver_backend  # 'z3', or 'sat' to enumerate the worlds with an embedded SAT solver
+        self.symmetry_breaking = symmetry_breaking  # keep one world per permutation of `interchangeable_values`
+        self.sampling = sampling  # 'first' worlds found by the solver, or 'diverse' worlds (see `hashed_check`)
+        self.truncated = None  # reason of the last truncated synthesis, if any
+        self.unsat_core = None  # labels of the unsat cores of the last synthesis without any task, if tracked
+        self.pworld_core = None  # labels of the unsat core of the last pworld without any world, if tracked
 
         ref_world = World.init_from_json(ref_world_js)
-        self.world_smt = WorldSMT(rows=rows, cols=cols)
+        # the variables and the grid-size constraints can be shared by the tasks of the same grid size
+        self.world_smt = world_smt if world_smt is not None else WorldSMT(rows=rows, cols=cols,
+                                                                          item_encoding=item_encoding)
+        self.sampling_vars = self.world_smt.sampling_vars()
 
         # build world type constraints
         if ref_world.markers_used:
@@ -40,14 +112,13 @@ class Code2Tasks():
                                                                             forb_ratio_variation=0.5)
 
         self.pworld_indep_prop = self.world_smt.pworld_indep_properties(
-            colors_straw=['red'],
-            colors_lemon=['yellow'],
-            colors_char=['black'],
-            colors_triangle=['red', 'green', 'blue'],
-            colors_rectangle=['red', 'green', 'blue'],
-            colors_cross=['red', 'green', 'blue'],
-            colors_circle=['red', 'green', 'blue', 'yellow',
-                           'orange', 'pink', 'purple', 'black'],
+            colors_straw=ITEM_COLORS['strawberry'],
+            colors_lemon=ITEM_COLORS['lemon'],
+            colors_char=ITEM_COLORS['A'],
+            colors_triangle=ITEM_COLORS['triangle'],
+            colors_rectangle=ITEM_COLORS['rectangle'],
+            colors_cross=ITEM_COLORS['cross'],
+            colors_circle=ITEM_COLORS['circle'],
             count_straw=[1, 2, 3, 4],
             count_lemon=[1],
             count_shapes=[1],
@@ -82,24 +153,266 @@ class Code2Tasks():
 
         return pworlds
 
-    def pworld_to_worlds(self, solver, pworld, n_max):
+    def pworld_to_worlds(self, solver, pworld, n_max, deadlines=None):
+        """
+        Enumerate at most `n_max` worlds. With `deadlines` ({reason: time.time() to stop at}), the
+        enumeration stops at the earliest one, and the reason is kept in `self.truncated`.
+        If there is no world at all, the labels of the tracked assertions in the unsat core are kept
+        in `self.pworld_core`.
+        """
         syn_worlds = []
+        self.pworld_core = None
 
-        while solver.check() == sat and len(syn_worlds) < n_max:
-            model_values = model2values(self.world_smt.vars, solver.model())
+        while len(syn_worlds) < n_max:
+            reason, deadline = earliest_deadline(deadlines)
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self.truncated = reason
+                    break
+                # a check must not run past the deadline
+                solver.set('timeout', max(1, int(remaining * 1000)))
+
+            if self.sampling == 'diverse' and not isinstance(solver, SatWorldSolver):
+                result, model = self.hashed_check(solver)
+            else:
+                result = solver.check()
+                model = solver.model() if result == sat else None
+            if result == unknown:
+                # the solver gave up, either at the deadline (z3 reports 'timeout' or 'canceled') or at the
+                # resource limit
+                if reason is not None and (time.time() >= deadline or
+                                           solver.reason_unknown() in ['timeout', 'canceled']):
+                    self.truncated = reason
+                elif 'resource limit' in solver.reason_unknown():
+                    self.truncated = 'solver_rlimit'
+                else:
+                    self.truncated = 'solver_unknown'
+                break
+            if result == unsat and len(syn_worlds) == 0:
+                self.pworld_core = {str(label) for label in solver.unsat_core()} or None
+            if result != sat:
+                break
+
+            model_values = model2values(self.world_smt.model_vars, model)
 
             # generated task
             syn_world = values2world(pworld.rows, pworld.cols, model_values=model_values)
             syn_worlds.append(syn_world)
 
             # next model cannot be exactly the same as the current one
-            solver.add(Not(exactly_the_same(self.world_smt.vars, model_values)))
+            if isinstance(solver, SatWorldSolver):
+                solver.block_model(model_values)
+            else:
+                solver.add(Not(exactly_the_same(self.world_smt.model_vars, model_values)))
 
         return syn_worlds
 
+    def hashed_check(self, solver):
+        """
+        Check the solver in a random cell of the worlds, cut by `random_xors` over `WorldSMT.sampling_vars`,
+        and return (result, model). The number of parity constraints, kept in
+        `solver.n_xors`, starts at `MAX_XORS` and goes down whenever a cell has no world left, so the last
+        check without any is a plain one, e.g., for the unsat core.
+        """
+        n_xors = getattr(solver, 'n_xors', MAX_XORS)
+        while n_xors > 0:
+            solver.push()
+            solver.add(random_xors(self.sampling_vars, n_xors))
+            result = solver.check()
+            model = solver.model() if result == sat else None
+            solver.pop()
+            if result != unsat:
+                solver.n_xors = n_xors
+                return result, model
+            n_xors -= 1
+
+        solver.n_xors = 0
+        result = solver.check()
+        return result, solver.model() if result == sat else None
+
+    def pworld_solver(self, pworld, cons_json, goal, ref_world_json, rlimit=None, track_cores=False):
+        """
+        Return the solver of the worlds for the given pworld. `rlimit` is the resource limit of z3 for each check.
+        With `track_cores`, the constraints are tracked in groups, so that an unsat core tells which of them
+        conflict: 'world', 'pworld', 'trace_opt', 'symmetry', and 'goal_k' for the k-th objective of the goal.
+        """
+        ref_world = World.init_from_json(ref_world_json)
+
+        # pworld-specific goal_smt
+        goal_smt = GoalSMT(rows=self.rows,
+                           cols=self.cols,
+                           vars=self.world_smt.vars,
+                           goal=goal,
+                           visited=pworld.trace,
+                           edge_colors=pworld.edge_colors)
+        s = Solver()
+        if rlimit is not None:
+            s.set('rlimit', rlimit)
+        if self.sampling == 'diverse':
+            # random seed and phases, so that the worlds of the pworld differ across the runs and the pworlds
+            s.set('random_seed', random.randrange(2 ** 31))
+            s.set('phase_selection', 5)
+
+        labels = []
+
+        def add(formula, label):
+            if track_cores:
+                # the constraints can be plain booleans, e.g., without any trace to keep optimal
+                s.assert_and_track(BoolVal(formula) if isinstance(formula, bool) else formula, label)
+                labels.append(label)
+            else:
+                s.add(formula)
+
+        add(And(self.pworld_indep_prop, self.world_type_cons), 'world')  # item-based or marker-based constraints
+        if track_cores:
+            for k, formula in enumerate(goal_smt.properties_per_objective()):
+                add(formula, f'goal_{k}')
+        else:
+            add(goal_smt.properties(), 'goal')
+        add(self.world_smt.properties_for_pworld(pworld, ref_world.markers_used), 'pworld')
+        if self.symmetry_breaking:
+            add(And([self.world_smt.properties_for_value_precedence(values)
+                     for values in interchangeable_values(ref_world, goal, pworld)]), 'symmetry')
+
+        # add trace optimality for non-draw task
+        if not isinstance(goal_smt.tar_smt, DrawSMT):
+            add(properties_for_optimal_trace(vars=goal_smt.vars, rows=pworld.rows, cols=pworld.cols,
+                                             visited=pworld.trace, init_dir=pworld.init_turtle.dir,
+                                             feasible_path_func=goal_smt.feasible_path,
+                                             trace_max_actions=8, code_constraints=cons_json), 'trace_opt')
+        if self.solver_backend == 'sat':
+            return SatWorldSolver(s, self.world_smt.model_vars, labels=labels,
+                                  random_phases=self.sampling == 'diverse')
+        return s
+
+    def worlds_to_tasks(self, worlds, cons_json, goal, debug=False):
+        cons = CodeConstraints(cons_json)
+        tasks = []
+        for world in worlds:
+            task = Task(world, goal, cons)
+            tasks.append(task)
+            if debug:
+                # show the tasks for debugging
+                from src.xlogomini.utils.image_conversions import task2image
+                task2image(task.to_json("debug"), show=True, save=False)
+                print("debugging")
+        return tasks
+
+    def synthesize_for_pworld(self, pworld, cons_json, goal, ref_world_json, n_worlds, debug=False,
+                              deadlines=None, rlimit=None, track_cores=False):
+        """
+        Generate at most `n_worlds` worlds for the given pworld, and return the tasks.
+        `deadlines` and `rlimit` (resource limit of z3 for each check) bound the time spent.
+        """
+        self.truncated = None
+        s = self.pworld_solver(pworld=pworld, cons_json=cons_json, goal=goal, ref_world_json=ref_world_json,
+                               rlimit=rlimit, track_cores=track_cores)
+        worlds = self.pworld_to_worlds(solver=s, pworld=pworld, n_max=n_worlds, deadlines=deadlines)
+        self.unsat_core = self.pworld_core
+        return self.worlds_to_tasks(worlds, cons_json=cons_json, goal=goal, debug=debug)
+
+    @staticmethod
+    def merge_cores(cores):
+        """
+        Return the union of the unsat cores of all the pworlds of a triple, or None if any pworld
+        has no core, i.e., it has worlds, it is truncated or the cores are not tracked.
+        """
+        if len(cores) == 0 or any(core is None for core in cores):
+            return None
+        return set().union(*cores)
+
+    def synthesize_sequential(self, pworlds, cons_json, goal, ref_world_json, n_worlds_per_init, n_max,
+                              debug=False, deadlines=None, pworld_time=None, rlimit=None, track_cores=False):
+        """
+        Step 2 of `synthesize`: generate the worlds of each pworld in turn, until `n_max` worlds.
+        """
+        all_tasks = []
+        truncated = None
+        cores = []
+        for pworld in pworlds:
+            # only synthesize `n_max` tasks
+            if len(all_tasks) >= n_max:
+                break
+            # stop if a deadline of the triple or the run has passed
+            reason, deadline = earliest_deadline(deadlines)
+            if deadline is not None and time.time() >= deadline:
+                truncated = reason
+                break
+
+            pworld_deadlines = dict(deadlines or {})
+            if pworld_time is not None:
+                pworld_deadlines['pworld_time'] = time.time() + pworld_time
+
+            # generate at most `n_worlds_per_init` worlds for a given pworld, and no more than needed
+            all_tasks.extend(self.synthesize_for_pworld(pworld=pworld, cons_json=cons_json, goal=goal,
+                                                        ref_world_json=ref_world_json,
+                                                        n_worlds=min(n_worlds_per_init, n_max - len(all_tasks)),
+                                                        debug=debug,
+                                                        deadlines=pworld_deadlines, rlimit=rlimit,
+                                                        track_cores=track_cores))
+            cores.append(self.pworld_core)
+            # keep the first reason, only the deadlines of the triple or the run stop the other pworlds
+            truncated = truncated or self.truncated
+            if self.truncated in (deadlines or {}):
+                break
+        self.truncated = truncated
+        self.unsat_core = self.merge_cores(cores) if len(cores) == len(pworlds) else None
+        return all_tasks
+
+    def synthesize_interleaved(self, pworlds, cons_json, goal, ref_world_json, n_worlds_per_init, n_max,
+                               debug=False, deadlines=None, pworld_time=None, rlimit=None, track_cores=False):
+        """
+        Same as `synthesize_sequential`, but take one world from each pworld in turn (round-robin),
+        so that the tasks come from all the pworlds even if `n_max` is reached early.
+        `pworld_time` is the total time spent on each pworld.
+        """
+        solvers = [self.pworld_solver(pworld=pworld, cons_json=cons_json, goal=goal,
+                                      ref_world_json=ref_world_json, rlimit=rlimit, track_cores=track_cores)
+                   for pworld in pworlds]
+        n_worlds = [0] * len(pworlds)
+        time_spent = [0.0] * len(pworlds)
+        active = list(range(len(pworlds)))
+        cores = [None] * len(pworlds)  # set on the first call of each pworld
+
+        all_tasks = []
+        truncated = None
+        self.unsat_core = None
+        while len(active) > 0 and len(all_tasks) < n_max:
+            for i in list(active):
+                if len(all_tasks) >= n_max:
+                    break
+                pworld_deadlines = dict(deadlines or {})
+                if pworld_time is not None:
+                    pworld_deadlines['pworld_time'] = time.time() + pworld_time - time_spent[i]
+
+                self.truncated = None
+                start_time = time.time()
+                worlds = self.pworld_to_worlds(solver=solvers[i], pworld=pworlds[i], n_max=1,
+                                               deadlines=pworld_deadlines)
+                time_spent[i] += time.time() - start_time
+                if n_worlds[i] == 0:
+                    cores[i] = self.pworld_core
+                all_tasks.extend(self.worlds_to_tasks(worlds, cons_json=cons_json, goal=goal, debug=debug))
+
+                # keep the first reason, only the deadlines of the triple or the run stop the other pworlds
+                truncated = truncated or self.truncated
+                if self.truncated in (deadlines or {}):
+                    self.truncated = truncated
+                    return all_tasks
+
+                n_worlds[i] += len(worlds)
+                if len(worlds) == 0 or n_worlds[i] >= n_worlds_per_init:
+                    active.remove(i)
+
+        self.truncated = truncated
+        self.unsat_core = self.merge_cores(cores)
+        return all_tasks
+
     def synthesize(self, code_json, cons_json, goal, ref_world_json,
                    n_init=1, n_worlds_per_init=1000, n_max=10000,
-                   log=False, debug=False):
+                   log=False, debug=False, deadlines=None, pworld_time=None, rlimit=None, interleave=False,
+                   track_cores=False):
         """
         Given the code_json, do the following steps:
         1. Generate pworlds:
@@ -108,53 +421,28 @@ class Code2Tasks():
         2. Generate worlds:
             First shuffle the pworlds. For each pworld (e.g., different init turtle), generate at most `n_worlds_per_init` worlds.
             However, once we get `n_max` worlds, then stop generating.
+            With `interleave`, the pworlds are visited round-robin, one world at a time.
         3. Task = world + goal + constraints
             Combine world, goal and constraints to get the tasks.
-        """
-        cons = CodeConstraints(cons_json)
-        ref_world = World.init_from_json(ref_world_json)
 
+        The time is bounded by `deadlines` ({reason: time.time() to stop at}), `pworld_time` (seconds
+        per pworld) and `rlimit` (resource limit of z3 for each check). If the tasks are truncated by
+        any of them, the reason is kept in `self.truncated`, otherwise it is None.
+        With `track_cores`, if no pworld has any world, the labels of their unsat cores (see `pworld_solver`)
+        are kept in `self.unsat_core`, otherwise it is None.
+        """
         # ----- 1. symbolic execution -----
         pworlds = self.symbolic_execution(code_json=code_json, n_inti_pos=n_init)
         random.shuffle(pworlds)
 
         # ------ 2. generate worlds ------
         start_time = time.time()
-        all_tasks = []
-        for pworld in pworlds:
-            # only synthesize `n_max` tasks
-            if len(all_tasks) >= n_max:
-                break
-            # pworld-specific goal_smt
-            goal_smt = GoalSMT(rows=self.rows,
-                               cols=self.cols,
-                               vars=self.world_smt.vars,
-                               goal=goal,
-                               visited=pworld.trace,
-                               edge_colors=pworld.edge_colors)
-            s = Solver()
-            s.add(self.pworld_indep_prop)
-            s.add(self.world_type_cons)  # item-based or marker-based constraints
-            s.add(goal_smt.properties())
-            s.add(self.world_smt.properties_for_pworld(pworld, ref_world.markers_used))
-
-            # add trace optimality for non-draw task
-            if not isinstance(goal_smt.tar_smt, DrawSMT):
-                s.add(properties_for_optimal_trace(vars=goal_smt.vars, rows=pworld.rows, cols=pworld.cols,
-                                                   visited=pworld.trace, init_dir=pworld.init_turtle.dir,
-                                                   feasible_path_func=goal_smt.feasible_path,
-                                                   trace_max_actions=8, code_constraints=cons_json))
-
-            # generate at most `n_worlds_per_init` worlds for a given pworld
-            worlds = self.pworld_to_worlds(solver=s, pworld=pworld, n_max=n_worlds_per_init)
-            if len(worlds) > 0:
-                for world in worlds:
-                    task = Task(world, goal, cons)
-                    all_tasks.append(task)
-                    if debug:
-                        # show the tasks for debugging
-                        task2image(task.to_json("debug"), show=True, save=False)
-                        print("debugging")
+        synthesize_worlds = self.synthesize_interleaved if interleave else self.synthesize_sequential
+        all_tasks = synthesize_worlds(pworlds=pworlds, cons_json=cons_json, goal=goal,
+                                      ref_world_json=ref_world_json,
+                                      n_worlds_per_init=n_worlds_per_init, n_max=n_max,
+                                      debug=debug, deadlines=deadlines, pworld_time=pworld_time, rlimit=rlimit,
+                                      track_cores=track_cores)
 
         if log:
             print(f"Total Synthesized Tasks: {len(all_tasks)}")
@@ -171,6 +459,14 @@ if __name__ == '__main__':
     parser.add_argument('--n_max', type=int, help='', default=20000)
     # params for task synthesis
     parser.add_argument('--symmetric', action='store_true', help='Require the forbidden areas to be symmetric')
+    parser.add_argument('--item_encoding', type=str, choices=ITEM_ENCODINGS, default='bool',
+                        help='Encoding of the items in the solver')
+    parser.add_argument('--solver_backend', type=str, choices=SOLVER_BACKENDS, default='z3',
+                        help='Enumerate the worlds with z3, or with a SAT solver (needs python-sat)')
+    parser.add_argument('--symmetry_breaking', action='store_true',
+                        help='Skip the worlds that only differ by a permutation of interchangeable items or colors')
+    parser.add_argument('--sampling', type=str, choices=SAMPLING_MODES, default='first',
+                        help='Enumerate the first worlds found by the solver, or diverse worlds')
     args = parser.parse_args()
 
     # load json
@@ -185,7 +481,11 @@ if __name__ == '__main__':
     c2t = Code2Tasks(rows=ref_world.rows + args.grid_size_inc,
                      cols=ref_world.cols + args.grid_size_inc,
                      ref_world_js=world_json,
-                     symmetric=args.symmetric)
+                     symmetric=args.symmetric,
+                     item_encoding=args.item_encoding,
+                     solver_backend=args.solver_backend,
+                     symmetry_breaking=args.symmetry_breaking,
+                     sampling=args.sampling)
     tasks = c2t.synthesize(code_json=code_json,
                            cons_json=cons_json,
                            goal=goal,
@@ -4,10 +4,16 @@ import json
 import argparse
 from src.xlogomini.smt.constraints.code_constraints_smt import CodeConstraintsSMT
 from z3 import And, Solver, sat, Not, Implies, Or, Sum
-from src.xlogomini.utils.formulas import exactly_the_same
 from src.xlogomini.smt.code.base_block_smt import *
 
 
+def canonical_key(instance):
+    """
+    Return a canonical string for a (code, constraints) instance produced by `CodeSyn.to_json`.
+    """
+    return json.dumps(instance, sort_keys=True, separators=(',', ':'))
+
+
 class CodeSyn():
     def __init__(self, code_js, cons_js):
         self.code_js = code_js
@@ -19,6 +25,7 @@ class CodeSyn():
         self.cons_smt = CodeConstraintsSMT(cons_js)
 
         self.vars = self._build_vars()
+        self.stats = {}
 
     def _build_vars(self):
         vars = {}
@@ -120,6 +127,13 @@ class CodeSyn():
         self.cons_smt.mutate()
         self.vars = self._build_vars()
 
+    def properties_for_same_instance(self, instance):
+        """
+        The mutated code and constraints must be exactly `instance` (the output of `to_json`).
+        """
+        return And(self.code_smt.properties_for_same_json(instance['code_json']),
+                   self.cons_smt.properties_for_same_json(instance['constraints']))
+
     def to_json(self, model_values):
         return {
             "code_json"  : self.code_smt.to_json(model_values, with_run=True),
@@ -152,23 +166,26 @@ class CodeSyn():
                               max_rep_times_inc=max_rep_times_inc, max_rep_times_dec=max_rep_times_dec,
                               max_cons_dec=max_cons_dec, max_cons_inc=max_cons_inc))
 
-        n = 0
-        while s.check() == sat and n < n_max:
-            n += 1
+        seen = set()
+        n_models = 0
+        while len(mutations) < n_max and s.check() == sat:
+            n_models += 1
             model_values = model2values(self.vars, s.model())
 
             instance = self.to_json(model_values)
-            mutations.append(instance)
-            # print(instance)
-            # print(Code(instance['code_json']))
-            # print((CodeConstraints(instance['constraints'])))
-            # print('===========================')
-
-            s.add(Not(exactly_the_same(self.vars, model_values)))
-
-        # remove the duplicated codes (only consider the code equivalence, don't consider cons)
-        string_list = [json.dumps(item, sort_keys=True) for item in mutations]
-        unique_set = set(string_list)
-        unique_mutations = [json.loads(item) for item in unique_set]
+            key = canonical_key(instance)
+            if key not in seen:
+                seen.add(key)
+                mutations.append(instance)
+
+            # models differing only in irrelevant variables (e.g., the position of `noblock`s)
+            # map to the same instance, so block the instance rather than the model
+            s.add(Not(self.properties_for_same_instance(instance)))
+
+        self.stats = {
+            "#models"  : n_models,
+            "#unique"  : len(mutations),
+            "dup_ratio": 1 - len(mutations) / n_models if n_models > 0 else 0
+        }
 
-        return unique_mutations
\ No newline at end of file
+        return mutations
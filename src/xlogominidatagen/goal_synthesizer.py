@@ -1,5 +1,5 @@
 import argparse
-from z3 import Int, Solver, Not, And, Or, simplify, sat, Distinct, Const, Implies
+from z3 import Int, Solver, Not, And, Or, simplify, sat, Distinct, Const, Implies, EnumSort
 import json
 import os
 from src.xlogomini.components.task import Goal
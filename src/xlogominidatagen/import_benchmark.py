@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# entry points: (modules, max import time in seconds, heavy modules that must not be imported)
+ENTRY_POINTS = {
+    'emulator': (['src.xlogomini.components.world.world', 'src.xlogomini.emulator.fast_emulator'], 0.4,
+                 ['z3', 'torch', 'networkx']),
+    'checker' : (['src.xlogomini.utils.checkers'], 0.4, ['torch', 'networkx']),
+    'smt'     : (['src.xlogomini.smt.world.world_smt'], 0.4, ['torch', 'networkx']),
+    'pipeline': (['src.xlogominidatagen.pipeline'], 0.8, ['torch', 'networkx']),
+}
+
+# dependencies that are slow to import, only imported by the functions that use them
+HEAVY_MODULES = ['z3', 'sympy', 'pandas', 'networkx', 'numpy', 'torch', 'tqdm', 'PIL']
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+for module in sys.argv[1:]:
+    __import__(module)
+print(json.dumps({'time': time.perf_counter() - start,
+                  'heavy': [m for m in %r if m in sys.modules]}))
+"""
+
+
+def time_import(modules, repeat=3):
+    """
+    Import the modules in fresh interpreters and return the best import time and the heavy modules loaded.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([root, os.path.join(root, 'src')]))
+    results = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT % HEAVY_MODULES] + modules,
+                             cwd=root, env=env, capture_output=True, text=True, check=True).stdout
+        results.append(json.loads(out))
+    return min(results, key=lambda result: result['time'])
+
+
+def benchmark(entry_points, repeat=3):
+    """
+    Print the import time of each entry point, and return whether they are all under their threshold
+    and import none of their forbidden heavy modules.
+    """
+    ok = True
+    for name in entry_points:
+        modules, max_time, forbidden = ENTRY_POINTS[name]
+        result = time_import(modules, repeat)
+        imported = [module for module in forbidden if module in result['heavy']]
+        status = 'SLOW' if result['time'] > max_time else 'OK'
+        if imported:
+            status = f"IMPORTS {', '.join(imported)}"
+        ok = ok and status == 'OK'
+        print(f"{name:<9} {result['time']:.3f}s (max {max_time:.1f}s) {status}  "
+              f"heavy: {', '.join(result['heavy']) or '-'}")
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entry_points', type=str, nargs='+', help='', default=list(ENTRY_POINTS),
+                        choices=list(ENTRY_POINTS))
+    parser.add_argument('--repeat', type=int, help='Number of fresh imports per entry point', default=3)
+    args = parser.parse_args()
+
+    sys.exit(0 if benchmark(args.entry_points, args.repeat) else 1)
@@ -4,18 +4,21 @@ import os
 import time
 import argparse
 from tqdm import tqdm
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from src.xlogomini.components.goal.goal import Goal
 from src.xlogomini.components.task import Task
 from src.xlogomini.components.world.world import World
 from src.xlogomini.components.code.xlogo_code import Code
 from src.xlogomini.utils.goal_set_cover import get_goal_set_cover
-from src.xlogomini.utils.load_data import load_task_json
+from src.xlogomini.utils.enums import ITEM_ENCODINGS, SOLVER_BACKENDS, SAMPLING_MODES
+from src.xlogomini.utils.load_data import load_task_ids
 from src.xlogomini.utils.load_data import load_code_json, load_cons_json, load_world_json, load_goal_json
 from src.xlogominidatagen.code_synthesizer import CodeSyn
 from src.xlogominidatagen.symexecution.symbolic_executor import SymExecutor
 from src.xlogominidatagen.code2task import Code2Tasks
+from src.xlogomini.smt.world.world_smt import WorldSMT
 from src.xlogominidatagen.goal_synthesizer import GoalSyn
+from src.xlogominidatagen.triple_filter import code_trace_stats, possible_items, infeasible_reason, UnsatRules
 
 
 def parse_difficulty(difficulty):
@@ -62,8 +65,26 @@ def parse_difficulty(difficulty):
         raise ValueError(f"Unknown difficulty {difficulty}")
 
 
-def synthesize_tasks_for_code_goal(code_cons, out_goal, ref_world_json, pre_cal_properties,
-                                   n_init_pos, n_worlds_per_init, n_tasks, debug, task_id, alg):
+# per-process cache of the grid-size constraints {(rows, cols, item_encoding): WorldSMT}, shared by all
+# the (code, cons, goal) triples and the tasks of the same grid size handled by the same process
+_pre_cal_properties = {}
+# per-process cache of {(task_id, item_encoding): {grid_size: Code2Tasks}}, on top of the grid-size
+# constraints, since the world constraints of a `Code2Tasks` depend on the reference world
+_code2tasks = {}
+
+# (tasks, truncated, unsat core) of a triple or a pworld whose process raised an error
+FAILED = ([], 'error', None)
+
+
+def get_code2tasks(code_cons, ref_world_json, pre_cal_properties, task_id, item_encoding='bool', solver_backend='z3',
+                   symmetry_breaking=False, sampling='first'):
+    """
+    Return the `Code2Tasks` for the minimal grid size of the code, built once per grid size.
+    `item_encoding` is the encoding of the items in the solver (see `ItemSMT`), `solver_backend`
+    the solver that enumerates the worlds (see `SatWorldSolver`), `symmetry_breaking` whether
+    to skip the permutations of interchangeable values (see `interchangeable_values`), and `sampling`
+    which worlds to enumerate (see `Code2Tasks.hashed_check`).
+    """
     executor = SymExecutor()  # used to calculate min rows and cols
 
     out_code = Code(code_cons['code_json'])
@@ -71,34 +92,141 @@ def synthesize_tasks_for_code_goal(code_cons, out_goal, ref_world_json, pre_cal_
     min_rows, min_cols = executor.get_min_world_size(out_code, square=(ref_world.cols == ref_world.cols))
     grid_size = f'{min_rows}x{min_cols}'
 
+    if pre_cal_properties is None:
+        pre_cal_properties = _code2tasks.setdefault((task_id, item_encoding), {})
+
     if grid_size not in pre_cal_properties.keys():
+        grid_key = (min_rows, min_cols, item_encoding)
+        if grid_key not in _pre_cal_properties:
+            _pre_cal_properties[grid_key] = WorldSMT(rows=min_rows, cols=min_cols, item_encoding=item_encoding)
         # if ref task is not symmetric (for 91, 92, 94)
         if task_id in ['91', '92', '94']:
             pre_cal_properties[grid_size] = Code2Tasks(rows=min_rows, cols=min_cols,
                                                        ref_world_js=ref_world_json,
-                                                       symmetric=False)
+                                                       symmetric=False,
+                                                       item_encoding=item_encoding,
+                                                       world_smt=_pre_cal_properties[grid_key])
         else:
             pre_cal_properties[grid_size] = Code2Tasks(rows=min_rows, cols=min_cols,
                                                        ref_world_js=ref_world_json,
-                                                       symmetric=True)
+                                                       symmetric=True,
+                                                       item_encoding=item_encoding,
+                                                       world_smt=_pre_cal_properties[grid_key])
+    # the options of the solvers do not change the pre-calculated constraints
+    pre_cal_properties[grid_size].solver_backend = solver_backend
+    pre_cal_properties[grid_size].symmetry_breaking = symmetry_breaking
+    pre_cal_properties[grid_size].sampling = sampling
+    return pre_cal_properties[grid_size]
 
-    if alg == 'xlogosyn':
-        tasks = pre_cal_properties[grid_size].synthesize(code_json=code_cons['code_json'],
-                                                         cons_json=code_cons['constraints'],
-                                                         goal=out_goal,
-                                                         ref_world_json=ref_world_json,
-                                                         n_init=n_init_pos,
-                                                         n_worlds_per_init=n_worlds_per_init,
-                                                         n_max=n_tasks,
-                                                         debug=debug)
-    else:
-        raise ValueError(f"Unknown algorithm {alg}")
 
+def tasks_to_json(tasks, code_cons, task_id):
     return [{'task_json'  : task.to_json(task_id),
              'code_json'  : code_cons['code_json'],
              'constraints': code_cons['constraints']} for task in tasks]
 
 
+def budget_deadlines(budget, triple_start):
+    """
+    Return the deadlines {reason: time.time() to stop at} of a triple started at `triple_start`.
+    """
+    deadlines = {}
+    if budget is not None and budget['run_deadline'] is not None:
+        deadlines['run_time'] = budget['run_deadline']
+    if budget is not None and budget['triple_time'] is not None:
+        deadlines['triple_time'] = triple_start + budget['triple_time']
+    return deadlines
+
+
+def synthesize_tasks_for_code_goal(code_cons, out_goal, ref_world_json, pre_cal_properties,
+                                   n_init_pos, n_worlds_per_init, n_tasks, debug, task_id, alg, budget=None,
+                                   interleave=False, track_cores=False, item_encoding='bool',
+                                   solver_backend='z3', symmetry_breaking=False, sampling='first'):
+    """
+    Return the synthesized tasks of the triple, the reason if they are truncated by the `budget`
+    ({'run_deadline', 'triple_time', 'pworld_time', 'rlimit'}) or None, and the labels of the unsat
+    cores if the triple has no task and `track_cores`, otherwise None.
+    """
+    deadlines = budget_deadlines(budget, time.time())
+    code2tasks = get_code2tasks(code_cons, ref_world_json, pre_cal_properties, task_id, item_encoding,
+                                solver_backend, symmetry_breaking, sampling)
+
+    if alg == 'xlogosyn':
+        tasks = code2tasks.synthesize(code_json=code_cons['code_json'],
+                                      cons_json=code_cons['constraints'],
+                                      goal=out_goal,
+                                      ref_world_json=ref_world_json,
+                                      n_init=n_init_pos,
+                                      n_worlds_per_init=n_worlds_per_init,
+                                      n_max=n_tasks,
+                                      debug=debug,
+                                      deadlines=deadlines,
+                                      pworld_time=budget['pworld_time'] if budget is not None else None,
+                                      rlimit=budget['rlimit'] if budget is not None else None,
+                                      interleave=interleave,
+                                      track_cores=track_cores)
+    else:
+        raise ValueError(f"Unknown algorithm {alg}")
+
+    return tasks_to_json(tasks, code_cons, task_id), code2tasks.truncated, code2tasks.unsat_core
+
+
+def synthesize_pworlds_for_code_goal(code_cons, ref_world_json, n_init_pos, task_id, item_encoding='bool'):
+    """
+    First step of `Code2Tasks.synthesize`, to split the pworlds of a triple into separate sub-tasks.
+    """
+    code2tasks = get_code2tasks(code_cons, ref_world_json, None, task_id, item_encoding)
+    pworlds = code2tasks.symbolic_execution(code_json=code_cons['code_json'], n_inti_pos=n_init_pos)
+    random.shuffle(pworlds)
+    return pworlds
+
+
+def synthesize_tasks_for_pworld(code_cons, out_goal, ref_world_json, pworld, n_worlds_per_init, debug, task_id,
+                                budget=None, triple_start=None, track_cores=False, item_encoding='bool',
+                                solver_backend='z3', symmetry_breaking=False, sampling='first'):
+    deadlines = budget_deadlines(budget, triple_start)
+    if budget is not None and budget['pworld_time'] is not None:
+        deadlines['pworld_time'] = time.time() + budget['pworld_time']
+
+    code2tasks = get_code2tasks(code_cons, ref_world_json, None, task_id, item_encoding, solver_backend,
+                                symmetry_breaking, sampling)
+    tasks = code2tasks.synthesize_for_pworld(pworld=pworld,
+                                             cons_json=code_cons['constraints'],
+                                             goal=out_goal,
+                                             ref_world_json=ref_world_json,
+                                             n_worlds=n_worlds_per_init,
+                                             debug=debug,
+                                             deadlines=deadlines,
+                                             rlimit=budget['rlimit'] if budget is not None else None,
+                                             track_cores=track_cores)
+    return tasks_to_json(tasks, code_cons, task_id), code2tasks.truncated, code2tasks.unsat_core
+
+
+def merge_pworld_tasks(pworld_tasks, n_tasks):
+    """
+    Merge the (tasks, truncated, unsat core) of the pworlds of a triple, in the order of the pworlds,
+    with the same stopping rule as `Code2Tasks.synthesize`. The first reason of truncation is kept.
+    """
+    all_tasks, truncated = [], None
+    for tasks, pworld_truncated, _ in pworld_tasks:
+        if len(all_tasks) >= n_tasks:
+            break
+        all_tasks.extend(tasks[:n_tasks - len(all_tasks)])
+        truncated = truncated or pworld_truncated
+    return all_tasks, truncated, Code2Tasks.merge_cores([core for _, _, core in pworld_tasks])
+
+
+def estimate_triple_cost(code_cons, goal, cost_cache):
+    """
+    Cheap estimate of the relative cost of a (code, cons, goal) triple. The constraints grow with
+    the cells of the grid and the trace to keep optimal, and with the objectives of the goal.
+    The code features are cached in `cost_cache`, since a code is shared by many triples.
+    """
+    stats = code_trace_stats(code_cons['code_json'], cost_cache)
+    if stats is None:
+        return 9 * goal.n_objs
+    return stats['n_cells'] * stats['trace_len'] * goal.n_objs
+
+
 def synthesize_code_cons(ref_code_json, ref_cons_json,
                          task_id, difficulty, diff_params, n_codes):
     if os.path.exists(f'{args.save_dir}/code/code_{task_id}_{difficulty}.json'):
@@ -114,6 +242,8 @@ def synthesize_code_cons(ref_code_json, ref_cons_json,
                                            exact_code_inc=diff_params['exact_code_inc'],
                                            max_cons_inc=diff_params['max_cons_inc'],
                                            max_cons_dec=diff_params['max_cons_dec'])
+        print(f"Code enumeration: {code_syn.stats['#models']} models, "
+              f"duplicate ratio {round(code_syn.stats['dup_ratio'], 4)}")
         os.makedirs(f'{args.save_dir}/code', exist_ok=True)
         json.dump(out_codes_cons, open(f'{args.save_dir}/code/code_{task_id}_{difficulty}.json', 'w'))
 
@@ -152,7 +282,8 @@ def synthesize_goals(ref_goal_json, task_id, difficulty, diff_params, n_goals, s
             out_goalsetcover = json.load(open(f'{args.save_dir}/datagen/goalsetcover_{task_id}_{difficulty}.json', 'r'))
             out_goalsetcover = [Goal.init_from_json(x) for x in out_goalsetcover]
         else:
-            out_goalsetcover = get_goal_set_cover([x.to_json() for x in out_goals])
+            out_goalsetcover = get_goal_set_cover([x.to_json() for x in out_goals],
+                                                  max_workers=args.max_workers if args.parallel else 1)
             json.dump([x for x in out_goalsetcover], open(f'{args.save_dir}/datagen/goalsetcover_{task_id}_{difficulty}.json', 'w'))
             out_goalsetcover = [Goal.init_from_json(x) for x in out_goalsetcover]
 
@@ -162,76 +293,114 @@ def synthesize_goals(ref_goal_json, task_id, difficulty, diff_params, n_goals, s
     return out_goals, out_goals
 
 
-def synthesize_tasks_wrapper(args_tuple):
+def write_tasks(tasks, all_out_tasks, task_sink):
+    """
+    Stream the tasks into `task_sink` (a jsonl file) if given, otherwise keep them in `all_out_tasks`.
+    """
+    if task_sink is not None:
+        for task in tasks:
+            task_sink.write(json.dumps(task) + '\n')
+    else:
+        all_out_tasks.extend(tasks)
+
+
+def synthesize_tasks_wrapper(task_args):
     all_tasks = []
-    tasks = synthesize_tasks_for_code_goal(*args_tuple)
+    tasks, truncated, core = synthesize_tasks_for_code_goal(**task_args)
     if len(tasks) > 0:
         all_tasks.extend(tasks)
-    return all_tasks
-
-
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='')
-    parser.add_argument('--task_id', type=str, help='', default="9a")
-    parser.add_argument('--rows', type=int, help='', default=3)
-    parser.add_argument('--cols', type=int, help='', default=3)
-    parser.add_argument('--diff', type=str, help='', default='easy')
-    parser.add_argument('--alg', type=str, help='', default='xlogosyn')
-
-    parser.add_argument('--n_codes', type=int, help='', default=100000)
-    parser.add_argument('--n_goals', type=int, help='', default=1000)
-    parser.add_argument('--n_init_pos', type=int, help='', default=3)
-    parser.add_argument('--n_worlds_per_init', type=int,
-                        help='Maximum {} worlds per initial position', default=1000)
-    parser.add_argument('--n_tasks_per_triple', type=int,
-                        help='Maximum {} tasks per (code, cons, goal) triple', default=3000)
+    return all_tasks, truncated, core
+
+
+def synthesize_pworlds_wrapper(task_args):
+    return synthesize_pworlds_for_code_goal(task_args['code_cons'], task_args['ref_world_json'],
+                                            task_args['n_init_pos'], task_args['task_id'], task_args['item_encoding'])
+
+
+def synthesize_pworld_wrapper(task_args, pworld, triple_start):
+    # a pworld never gives more than the triple needs
+    return synthesize_tasks_for_pworld(task_args['code_cons'], task_args['out_goal'], task_args['ref_world_json'],
+                                       pworld, min(task_args['n_worlds_per_init'], task_args['n_tasks']),
+                                       task_args['debug'], task_args['task_id'], budget=task_args['budget'],
+                                       triple_start=triple_start, track_cores=task_args['track_cores'],
+                                       item_encoding=task_args['item_encoding'],
+                                       solver_backend=task_args['solver_backend'],
+                                       symmetry_breaking=task_args['symmetry_breaking'],
+                                       sampling=task_args['sampling'])
+
+
+def supported_task_ids():
+    """
+    Return the ids of the reference tasks whose worlds can be loaded, i.e., without the unsupported items of
+    the tasks 110-115.
+    """
+    task_ids = []
+    for task_id in load_task_ids():
+        try:
+            World.init_from_json(load_world_json(task_id))
+        except (AssertionError, ValueError):
+            continue
+        task_ids.append(task_id)
+    return task_ids
+
+
+def filter_triples(code_cons_goals, ref_world_json, n_max):
+    """
+    Return the first `n_max` triples that pass the pre-filter, so that every rejected triple is
+    replaced by the next one in the shuffled order, and the number of rejected triples per reason.
+    """
+    items = possible_items(ref_world_json)
+    code_stats_cache = {}
+    feasible, n_rejected = [], {}
+    for code_cons_goal in code_cons_goals:
+        if len(feasible) >= n_max:
+            break
+        code_stats = code_trace_stats(code_cons_goal['code_cons']['code_json'], code_stats_cache)
+        reason = infeasible_reason(code_stats, code_cons_goal['goal'], items)
+        if reason is None:
+            feasible.append(code_cons_goal)
+        else:
+            n_rejected[reason] = n_rejected.get(reason, 0) + 1
+    return feasible, n_rejected
 
-    parser.add_argument('--debug', action='store_true', help='')
-    parser.add_argument('--parallel', action='store_true', help='')
-    parser.add_argument('--max_workers', type=int, help='', default=24)
 
-    parser.add_argument('--save_dir', type=str, help='', default='./results/datagen')
+def init_worker(main_args):
+    """
+    Set the arguments of the run in a worker process, which runs `prepare_triples` as well.
+    """
+    global args
+    args = main_args
 
-    args = parser.parse_args()
 
-    # create dir if not exist
-    diff_params = parse_difficulty(args.diff)
+def prepare_triples(task_id, difficulty):
+    """
+    Run the code and goal mutations for (task_id, difficulty), and return the (code, cons, goal)
+    triples to synthesize tasks for, with their stats. Runs in the workers in parallel mode.
+    """
+    start_time, start_local_time = time.time(), time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+    diff_params = parse_difficulty(difficulty)
 
     # ref code, ref cons, ref goal
-    ref_code_json = load_code_json(args.task_id)
-    ref_cons_json = load_cons_json(args.task_id)
-    ref_goal_json = load_goal_json(args.task_id)
-    ref_world_json = load_world_json(args.task_id)
-    ref_task_json = load_task_json(args.task_id)
-
-    ref_world = World.init_from_json(ref_world_json)
-    ref_code = Code(ref_code_json)
-    ref_task = Task.init_from_json(ref_task_json)
+    ref_code_json = load_code_json(task_id)
+    ref_cons_json = load_cons_json(task_id)
+    ref_goal_json = load_goal_json(task_id)
+    ref_world_json = load_world_json(task_id)
 
     print(f"===== Stage 1: Code Mutation ====")
     out_codes_cons = synthesize_code_cons(ref_code_json=ref_code_json,
                                           ref_cons_json=ref_cons_json,
-                                          task_id=args.task_id,
-                                          difficulty=args.diff,
+                                          task_id=task_id,
+                                          difficulty=difficulty,
                                           diff_params=diff_params,
                                           n_codes=args.n_codes)
 
     print(f"\n==== Stage 2: Goal Mutation ====")
     out_goals, out_goalsetcovers = synthesize_goals(ref_goal_json=ref_goal_json,
-                                                    task_id=args.task_id,
-                                                    difficulty=args.diff,
+                                                    task_id=task_id,
+                                                    difficulty=difficulty,
                                                     diff_params=diff_params,
                                                     n_goals=args.n_goals)
 
-    print(f"\n==== Stage 3: Symbolic Execution ====")
-    # ------------ gen tasks -------------
-    # cal the grid size
-    pre_cal_properties = {}
-
-    start_time = time.time()
-    # get the local time
-    start_local_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-
     assert len(out_codes_cons) > 0
     assert len(out_goals) > 0
 
@@ -246,77 +415,152 @@ if __name__ == '__main__':
 
     # randomly sample 1k (code, cons, goal) triples
     random.shuffle(code_cons_goals)
+    n_rejected = {}  # reason -> #triples
+    if args.prefilter:
+        print(f"\n==== Pre-filtering (code, cons, goal) triples ====")
+        code_cons_goals, n_rejected = filter_triples(code_cons_goals, ref_world_json, 1000)
+        print(f"Rejected {sum(n_rejected.values())} infeasible triples: {n_rejected}")
     code_cons_goals = code_cons_goals[:1000]
 
-    ################ for debugging ###############
-    n_code_cons_goal_used = 0
-    all_out_tasks = []
+    return {
+        'task_id'         : task_id,
+        'diff'            : difficulty,
+        'diff_params'     : diff_params,
+        'ref_world_json'  : ref_world_json,
+        'code_cons_goals' : code_cons_goals,
+        'n_code_cons'     : len(out_codes_cons),
+        'n_goals'         : len(out_goals),
+        'rejected'        : n_rejected,
+        'start_time'      : start_time,
+        'start_local_time': start_local_time,
+    }
 
-    # Create tuples of arguments for parallel processing
-    if args.parallel:
-        task_args = []
-        for out_code_cons_goal in code_cons_goals:
-            task_args.append((
-                out_code_cons_goal['code_cons'],
-                out_code_cons_goal['goal'],
-                ref_world_json,
-                pre_cal_properties,
-                args.n_init_pos,
-                args.n_worlds_per_init,
-                args.n_tasks_per_triple,  # n_tasks per code-goal pair
-                args.debug,
-                args.task_id,
-                args.alg))
-
-        # Parallel processing
-        with ProcessPoolExecutor(max_workers=args.max_workers) as executor:
-            future_to_task = {executor.submit(synthesize_tasks_wrapper, arg): arg for arg in task_args}
-
-            # Initialize tqdm progress bar
-            with tqdm(total=len(future_to_task), desc=f"Synthesizing {args.task_id}-{args.diff}-{args.alg}",
-                      unit="code-cons-goal") as progress_bar:
-                for future in as_completed(future_to_task):
-                    out_tasks_each_code = future.result()
-                    if len(out_tasks_each_code) > 0:
-                        n_code_cons_goal_used += 1
-                        all_out_tasks.extend(out_tasks_each_code)
-
-                    # Update the progress bar
-                    progress_bar.update(1)
-    else:
-        for out_code_cons_goal in tqdm(code_cons_goals,
-                                       desc=f"Synthesizing {args.task_id}-{args.diff}-{args.alg}",
-                                       unit="code-cons-goal"):
-            # Sequential processing
-            out_tasks_each_code = synthesize_tasks_for_code_goal(code_cons=out_code_cons_goal['code_cons'],
-                                                                 out_goal=out_code_cons_goal['goal'],
-                                                                 ref_world_json=ref_world_json,
-                                                                 pre_cal_properties=pre_cal_properties,
-                                                                 n_init_pos=args.n_init_pos,
-                                                                 n_worlds_per_init=args.n_worlds_per_init,
-                                                                 n_tasks=args.n_tasks_per_triple,
-                                                                 debug=args.debug,
-                                                                 task_id=args.task_id,
-                                                                 alg=args.alg)
-            if len(out_tasks_each_code) > 0:
-                n_code_cons_goal_used += 1
-                all_out_tasks.extend(out_tasks_each_code)
+
+def make_job(triples):
+    """
+    Return the job of the triples of `prepare_triples`, with its task sink and stats.
+    """
+    task_id, difficulty = triples['task_id'], triples['diff']
+
+    # the tasks are either saved as a json list at the end, or streamed into a jsonl file
+    os.makedirs(f'{args.save_dir}/task', exist_ok=True)
+    task_sink = None
+    if args.jsonl:
+        task_sink = open(f'{args.save_dir}/task/task_{task_id}_{difficulty}_{args.alg}.jsonl', 'w')
+
+    return {
+        'task_id'              : task_id,
+        'diff'                 : difficulty,
+        'diff_params'          : triples['diff_params'],
+        'ref_world_json'       : triples['ref_world_json'],
+        'code_cons_goals'      : triples['code_cons_goals'],
+        'n_code_cons'          : triples['n_code_cons'],
+        'n_goals'              : triples['n_goals'],
+        'n_pending'            : len(triples['code_cons_goals']),
+        'n_code_cons_goal_used': 0,
+        'n_out_tasks'          : 0,
+        'all_out_tasks'        : [],
+        'task_sink'            : task_sink,
+        'truncated'            : {},  # reason -> #triples
+        'rejected'             : triples['rejected'],
+        'unsat_rules'          : UnsatRules(),
+        'code_stats'           : {},  # cache of `code_trace_stats`
+        'start_time'           : triples['start_time'],
+        'start_local_time'     : triples['start_local_time'],
+    }
+
+
+def prepare_job(task_id, difficulty):
+    """
+    Run the code and goal mutations for (task_id, difficulty), and return the job with the
+    (code, cons, goal) triples to synthesize tasks for.
+    """
+    return make_job(prepare_triples(task_id, difficulty))
+
+
+def job_task_args(job, budget):
+    """
+    Return the keyword arguments of `synthesize_tasks_for_code_goal` for each triple of the job.
+    """
+    task_args = []
+    for out_code_cons_goal in job['code_cons_goals']:
+        task_args.append({
+            'code_cons'         : out_code_cons_goal['code_cons'],
+            'out_goal'          : out_code_cons_goal['goal'],
+            'ref_world_json'    : job['ref_world_json'],
+            'pre_cal_properties': None,  # grid-size constraints, cached in each process
+            'n_init_pos'        : args.n_init_pos,
+            'n_worlds_per_init' : args.n_worlds_per_init,
+            'n_tasks'           : args.n_tasks_per_triple,  # n_tasks per code-goal pair
+            'debug'             : args.debug,
+            'task_id'           : job['task_id'],
+            'alg'               : args.alg,
+            'budget'            : budget,
+            'interleave'        : args.interleave_pworlds,
+            'track_cores'       : args.prune_unsat_cores,
+            'item_encoding'     : args.item_encoding,
+            'solver_backend'    : args.solver_backend,
+            'symmetry_breaking' : args.symmetry_breaking,
+            'sampling'          : args.sampling,
+        })
+    return task_args
+
+
+def learn_unsat_rule(job, code_cons, goal, core):
+    """
+    Learn the rule of the unsat `core` of a triple without any task, if the cores are tracked.
+    """
+    if core is not None:
+        stats = code_trace_stats(code_cons['code_json'], job['code_stats'])
+        job['unsat_rules'].add(stats['shape'] if stats is not None else None, core, goal,
+                               code_cons['constraints'])
+
+
+def pruned_by_unsat_rules(job, code_cons, goal):
+    """
+    Whether the triple is pruned by the rules learned so far for the job.
+    """
+    if len(job['unsat_rules']) == 0:
+        return False
+    stats = code_trace_stats(code_cons['code_json'], job['code_stats'])
+    return job['unsat_rules'].match(stats['shape'] if stats is not None else None, goal, code_cons['constraints'])
+
+
+def add_job_pruned(job):
+    job['n_pending'] -= 1
+    job['rejected']['unsat_core'] = job['rejected'].get('unsat_core', 0) + 1
+
+
+def add_job_tasks(job, out_tasks_each_code, truncated):
+    job['n_pending'] -= 1
+    if truncated is not None:
+        job['truncated'][truncated] = job['truncated'].get(truncated, 0) + 1
+    if len(out_tasks_each_code) > 0:
+        job['n_code_cons_goal_used'] += 1
+        job['n_out_tasks'] += len(out_tasks_each_code)
+        write_tasks(out_tasks_each_code, job['all_out_tasks'], job['task_sink'])
+
+
+def finish_job(job):
+    task_id, difficulty = job['task_id'], job['diff']
 
     # save args into json, including the time
     params = {
-        'args'       : vars(args),
-        "start_time" : start_local_time,
+        'args'       : dict(vars(args), task_id=task_id, diff=difficulty),
+        "start_time" : job['start_local_time'],
         "end_time"   : time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
-        'diff_params': diff_params,
+        'diff_params': job['diff_params'],
         'stats'      : {
-            "task_id"        : args.task_id,
-            "level"          : args.diff,
+            "task_id"        : task_id,
+            "level"          : difficulty,
             "alg"            : args.alg,
-            "#code-cons"     : len(out_codes_cons),
-            "#goals"         : len(out_goals),
-            "#code-cons-goal": n_code_cons_goal_used,
-            "#tasks"         : len(all_out_tasks),
-            "run_time"       : time.time() - start_time
+            "#code-cons"     : job['n_code_cons'],
+            "#goals"         : job['n_goals'],
+            "#code-cons-goal": job['n_code_cons_goal_used'],
+            "#tasks"         : job['n_out_tasks'],
+            "run_time"       : time.time() - job['start_time'],
+            "truncated"      : job['truncated'],
+            "rejected"       : job['rejected'],
         },
         # machine details
 
@@ -324,15 +568,213 @@ if __name__ == '__main__':
 
     # save the number in a file
     os.makedirs(f'{args.save_dir}/params', exist_ok=True)
-    json.dump(params, open(f'{args.save_dir}/params/params_{args.task_id}_{args.diff}_{args.alg}.json', 'w'))
+    json.dump(params, open(f'{args.save_dir}/params/params_{task_id}_{difficulty}_{args.alg}.json', 'w'))
 
     # save the tasks
-    os.makedirs(f'{args.save_dir}/task', exist_ok=True)
-    json.dump(all_out_tasks, open(f'{args.save_dir}/task/task_{args.task_id}_{args.diff}_{args.alg}.json', 'w'))
+    if job['task_sink'] is not None:
+        job['task_sink'].close()
+    else:
+        json.dump(job['all_out_tasks'], open(f'{args.save_dir}/task/task_{task_id}_{difficulty}_{args.alg}.json', 'w'))
 
     # print params dict with indentation
     print(json.dumps(params, indent=2))
 
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='')
+    parser.add_argument('--task_id', type=str, help='', default="9a")
+    parser.add_argument('--task_ids', type=str, nargs='+',
+                        help='Run a batch of tasks on one pool, "all" for all the reference tasks', default=None)
+    parser.add_argument('--rows', type=int, help='', default=3)
+    parser.add_argument('--cols', type=int, help='', default=3)
+    parser.add_argument('--diff', type=str, help='', default='easy')
+    parser.add_argument('--diffs', type=str, nargs='+', help='Difficulties of the batch', default=None)
+    parser.add_argument('--alg', type=str, help='', default='xlogosyn')
+
+    parser.add_argument('--n_codes', type=int, help='', default=100000)
+    parser.add_argument('--n_goals', type=int, help='', default=1000)
+    parser.add_argument('--n_init_pos', type=int, help='', default=3)
+    parser.add_argument('--n_worlds_per_init', type=int,
+                        help='Maximum {} worlds per initial position', default=1000)
+    parser.add_argument('--n_tasks_per_triple', type=int,
+                        help='Maximum {} tasks per (code, cons, goal) triple', default=3000)
+
+    parser.add_argument('--debug', action='store_true', help='')
+    parser.add_argument('--parallel', action='store_true', help='')
+    parser.add_argument('--max_workers', type=int, help='', default=24)
+    parser.add_argument('--split_pworlds', action='store_true',
+                        help='Synthesize the worlds of each pworld of a triple as a separate sub-task')
+    parser.add_argument('--interleave_pworlds', action='store_true',
+                        help='Take the worlds of the pworlds of a triple round-robin')
+    parser.add_argument('--prefilter', action='store_true',
+                        help='Replace the (code, cons, goal) triples that cannot have any task before stage 3')
+    parser.add_argument('--prune_unsat_cores', action='store_true',
+                        help='Learn rules from the unsat cores of the triples without any task, '
+                             'and skip the pending triples they match')
+
+    # budgets, the tasks synthesized so far are kept when a budget runs out
+    parser.add_argument('--run_time_budget', type=float, help='Seconds for the whole run', default=None)
+    parser.add_argument('--triple_time_budget', type=float, help='Seconds per (code, cons, goal) triple',
+                        default=None)
+    parser.add_argument('--pworld_time_budget', type=float, help='Seconds per pworld', default=None)
+    parser.add_argument('--solver_rlimit', type=int, help='Resource limit of z3 for each check', default=None)
+    parser.add_argument('--item_encoding', type=str, choices=ITEM_ENCODINGS, default='bool',
+                        help='Encoding of the items in the solver: a boolean per name and color, '
+                             'enumeration sorts, or bit-vectors')
+    parser.add_argument('--solver_backend', type=str, choices=SOLVER_BACKENDS, default='z3',
+                        help='Enumerate the worlds of each pworld with z3, or compile them to CNF once '
+                             'and enumerate them with an embedded SAT solver (needs python-sat)')
+    parser.add_argument('--symmetry_breaking', action='store_true',
+                        help='Skip the worlds that only differ by a permutation of interchangeable item names '
+                             'or colors, e.g., the colors for a goal on shapes only')
+    parser.add_argument('--sampling', type=str, choices=SAMPLING_MODES, default='first',
+                        help='Enumerate the first worlds found by the solver, or diverse worlds with random '
+                             'seeds and random parity constraints over the items, forbidden tiles and walls')
+
+    parser.add_argument('--save_dir', type=str, help='', default='./results/datagen')
+    parser.add_argument('--jsonl', action='store_true', help='Stream the tasks into a jsonl file')
+
+    args = parser.parse_args()
+
+    task_ids = [args.task_id] if args.task_ids is None else args.task_ids
+    if task_ids == ['all']:
+        task_ids = supported_task_ids()
+    diffs = [args.diff] if args.diffs is None else args.diffs
+
+    start_time = time.time()
+    budget = {
+        'run_deadline': start_time + args.run_time_budget if args.run_time_budget is not None else None,
+        'triple_time' : args.triple_time_budget,
+        'pworld_time' : args.pworld_time_budget,
+        'rlimit'      : args.solver_rlimit,
+    }
+
+    # ------------ gen tasks -------------
+    if args.parallel:
+        # the preparation (stages 1 and 2) and the triples of all the jobs share one pool, so that the workers
+        # stay busy until the last job ends, and the triples of a job start as soon as it is prepared
+        with ProcessPoolExecutor(max_workers=args.max_workers, initializer=init_worker,
+                                 initargs=(args,)) as executor:
+            # future -> (job, args, stage), where the stage is 'prepare' for the preparation of a job, 'triple' for
+            # a whole triple, and 'pworlds' then ('pworld', split, idx) for a triple whose pworlds are split into
+            # sub-tasks
+            pending = {}
+            for task_id in task_ids:
+                for diff in diffs:
+                    pending[executor.submit(prepare_triples, task_id, diff)] = (None, (task_id, diff), 'prepare')
+            cost_cache = {}
+
+            # Initialize tqdm progress bar, the triples are added as the jobs are prepared
+            with tqdm(total=0, desc=f"Synthesizing {','.join(task_ids)}-{','.join(diffs)}-{args.alg}",
+                      unit="code-cons-goal") as progress_bar:
+                while len(pending) > 0:
+                    done, _ = wait(pending.keys(), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        job, arg, stage = pending.pop(future)
+                        error = future.exception()
+                        if stage == 'prepare':
+                            if error is not None:
+                                # only the job fails, the other jobs go on
+                                print(f"\nThe preparation of task {arg[0]}-{arg[1]} failed: {error!r}")
+                                continue
+                            job = make_job(future.result())
+                            # submit the longest triples first, so that they don't end up as the tail of the job
+                            triples = job_task_args(job, budget)
+                            triples.sort(key=lambda x: estimate_triple_cost(x['code_cons'], x['out_goal'],
+                                                                            cost_cache), reverse=True)
+                            for triple in triples:
+                                if args.split_pworlds:
+                                    pending[executor.submit(synthesize_pworlds_wrapper, triple)] = \
+                                        (job, triple, 'pworlds')
+                                else:
+                                    pending[executor.submit(synthesize_tasks_wrapper, triple)] = \
+                                        (job, triple, 'triple')
+                            progress_bar.total += len(triples)
+                            progress_bar.refresh()
+                            if job['n_pending'] == 0:
+                                # e.g., all the triples are rejected by the pre-filter
+                                finish_job(job)
+                            continue
+
+                        if error is not None:
+                            # only the triple fails, the other triples and jobs go on
+                            print(f"\nA triple of task {job['task_id']}-{job['diff']} failed: {error!r}")
+                        if stage == 'pworlds':
+                            pworlds = future.result() if error is None else []
+                            split = {'tasks': [None] * len(pworlds), 'n_pending': len(pworlds)}
+                            for idx, pworld in enumerate(pworlds):
+                                pending[executor.submit(synthesize_pworld_wrapper, arg, pworld, time.time())] = \
+                                    (job, arg, ('pworld', split, idx))
+                            if len(pworlds) > 0:
+                                continue
+                            out_tasks_each_code, truncated, core = [], None if error is None else 'error', None
+                        elif stage == 'triple':
+                            out_tasks_each_code, truncated, core = future.result() if error is None else FAILED
+                        else:
+                            _, split, idx = stage
+                            split['tasks'][idx] = future.result() if error is None else FAILED
+                            split['n_pending'] -= 1
+                            if split['n_pending'] > 0:
+                                continue
+                            out_tasks_each_code, truncated, core = merge_pworld_tasks(split['tasks'],
+                                                                                      args.n_tasks_per_triple)
+
+                        add_job_tasks(job, out_tasks_each_code, truncated)
+                        n_done = 1
+
+                        if core is not None:
+                            # skip the triples of the job that are not started yet and match the new rule
+                            learn_unsat_rule(job, arg['code_cons'], arg['out_goal'], core)
+                            for other, (other_job, other_arg, other_stage) in list(pending.items()):
+                                if other_job is job and other_stage in ['triple', 'pworlds'] and \
+                                        pruned_by_unsat_rules(job, other_arg['code_cons'], other_arg['out_goal']) and \
+                                        other.cancel():
+                                    del pending[other]
+                                    add_job_pruned(job)
+                                    n_done += 1
+
+                        if job['n_pending'] == 0:
+                            finish_job(job)
+
+                        # Update the progress bar
+                        progress_bar.update(n_done)
+    else:
+        for task_id in task_ids:
+            for diff in diffs:
+                job = prepare_job(task_id, diff)
+
+                print(f"\n==== Stage 3: Symbolic Execution ====")
+                for out_code_cons_goal in tqdm(job['code_cons_goals'],
+                                               desc=f"Synthesizing {task_id}-{diff}-{args.alg}",
+                                               unit="code-cons-goal"):
+                    if pruned_by_unsat_rules(job, out_code_cons_goal['code_cons'], out_code_cons_goal['goal']):
+                        add_job_pruned(job)
+                        continue
+
+                    # Sequential processing
+                    out_tasks_each_code, truncated, core = synthesize_tasks_for_code_goal(
+                        code_cons=out_code_cons_goal['code_cons'],
+                        out_goal=out_code_cons_goal['goal'],
+                        ref_world_json=job['ref_world_json'],
+                        pre_cal_properties=None,
+                        n_init_pos=args.n_init_pos,
+                        n_worlds_per_init=args.n_worlds_per_init,
+                        n_tasks=args.n_tasks_per_triple,
+                        debug=args.debug,
+                        task_id=task_id,
+                        alg=args.alg,
+                        budget=budget,
+                        interleave=args.interleave_pworlds,
+                        track_cores=args.prune_unsat_cores,
+                        item_encoding=args.item_encoding,
+                        solver_backend=args.solver_backend,
+                        symmetry_breaking=args.symmetry_breaking,
+                        sampling=args.sampling)
+                    add_job_tasks(job, out_tasks_each_code, truncated)
+                    if len(out_tasks_each_code) == 0:
+                        learn_unsat_rule(job, out_code_cons_goal['code_cons'], out_code_cons_goal['goal'], core)
+                finish_job(job)
+
     print('Done')
 
     end_time = time.time()
@@ -0,0 +1,77 @@
+import numpy as np
+
+
+class P2Quantile(object):
+    """
+    Estimate the p-quantile of a stream with the P² algorithm (Jain & Chlamtac, 1985),
+    which keeps 5 markers instead of all the observations.
+    """
+
+    def __init__(self, p):
+        assert 0 < p < 1
+        self.p = p
+        self.count = 0
+
+        self.heights = []  # marker heights
+        self.pos = [0, 1, 2, 3, 4]  # actual marker positions
+        self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]  # desired marker positions
+        self.incs = [0, p / 2, p, (1 + p) / 2, 1]  # increments of the desired positions
+
+    def add(self, x):
+        self.count += 1
+
+        # the first 5 observations initialize the markers
+        if self.count <= 5:
+            self.heights.append(x)
+            self.heights.sort()
+            return
+
+        q, n = self.heights, self.pos
+
+        # find the cell k such that q[k] <= x < q[k+1], extending the extreme markers if needed
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while not (q[k] <= x < q[k + 1]):
+                k += 1
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.incs[i]
+
+        # adjust the heights of the 3 middle markers
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = self._linear(i, d)
+                q[i] = height
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.heights, self.pos
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+                (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i]) +
+                (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def _linear(self, i, d):
+        q, n = self.heights, self.pos
+        return q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+
+    def value(self):
+        """
+        Return the current estimate, which is exact for fewer than 5 observations.
+        """
+        if self.count == 0:
+            return np.nan
+        if self.count <= 5:
+            return float(np.percentile(self.heights, self.p * 100))
+        return self.heights[2]
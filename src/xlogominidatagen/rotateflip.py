@@ -1,6 +1,10 @@
 import copy
-from src.xlogomini.utils.load_data import load_task_json, load_code_json
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from src.xlogomini.utils.load_data import load_task_json, load_code_json, load_task_ids, iter_tasks
 from src.xlogomini.utils.image_conversions import create_task_code_img_sidebyside
+from src.xlogomini.emulator.executor import execute
 import argparse
 
 
@@ -163,6 +167,74 @@ def generate(ref_task_json, ref_code_json, diff):
     return syn_task_json, syn_code_json
 
 
+def generate_all(task_ids, diffs):
+    """
+    Yield (task_id, diff, syn_task_json, syn_code_json, ref_task_json, ref_code_json) for each reference task
+    and difficulty. The assets are loaded once for all the tasks.
+    """
+    for task_id, ref_task_json, ref_code_json in iter_tasks(task_ids):
+        for diff in diffs:
+            yield (task_id, diff) + generate(ref_task_json, ref_code_json, diff) + (ref_task_json, ref_code_json)
+
+
+def validate(args_tuple, save_dir=None, show_ref=False):
+    """
+    Run the code of a synthesized task in the emulator and return its jsonl record. With `save_dir`,
+    the side-by-side image is saved as well. A task that cannot be run or rendered is not valid.
+    """
+    task_id, diff, syn_task_json, syn_code_json, ref_task_json, ref_code_json = args_tuple
+    try:
+        result = execute(syn_task_json, syn_code_json)
+        err_msg = result['err_msg']
+        valid = not result['crashed'] and bool(result['goal_ok']) and bool(result['cons_ok'])
+        if save_dir is not None:
+            create_task_code_img_sidebyside(syn_task_json=syn_task_json, syn_code_json=syn_code_json,
+                                            ref_task_json=ref_task_json, ref_code_json=ref_code_json, show=False,
+                                            diff=diff, save=True, show_ref=show_ref,
+                                            filename=f'{save_dir}/image/{task_id}_{diff}_rotateflip.png')
+    except Exception as e:
+        # e.g., items that the emulator or the renderer do not know
+        err_msg, valid = f'{type(e).__name__}: {e}', False
+
+    return {'task_id'    : task_id,
+            'diff'       : diff,
+            'task_json'  : syn_task_json,
+            'code_json'  : syn_code_json,
+            'constraints': syn_task_json['constraints'],
+            'valid'      : valid,
+            'err_msg'    : err_msg}
+
+
+def validate_wrapper(args):
+    return validate(*args)
+
+
+def validated_records(args, max_workers):
+    # the records are yielded in order, as soon as they are ready
+    if max_workers <= 1:
+        yield from map(validate_wrapper, args)
+        return
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(validate_wrapper, args, chunksize=8)
+
+
+def generate_batch(task_ids, diffs, save_dir, max_workers=1, save_img=False, show_ref=False):
+    """
+    Generate the tasks of all the reference tasks and difficulties, validate them with the emulator
+    on a pool of `max_workers` processes, and stream them into a jsonl file in order. Return the number
+    of (valid, generated) tasks.
+    """
+    os.makedirs(f'{save_dir}/task', exist_ok=True)
+    args = ((args_tuple, save_dir if save_img else None, show_ref) for args_tuple in generate_all(task_ids, diffs))
+    n_valid = n_tasks = 0
+    with open(f'{save_dir}/task/task_rotateflip.jsonl', 'w') as f:
+        for record in validated_records(args, max_workers):
+            f.write(json.dumps(record) + '\n')
+            n_valid += record['valid']
+            n_tasks += 1
+    return n_valid, n_tasks
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='')
     parser.add_argument('--task_id', type=str, help='', default="87")
@@ -172,15 +244,29 @@ if __name__ == '__main__':
     parser.add_argument('--show_img', action='store_true', help='show images')
     parser.add_argument('--save_img', action='store_true', help='save images')
     parser.add_argument('--show_ref', action='store_true', help='add ref task to the image')
+    parser.add_argument('--batch', action='store_true',
+                        help='Generate and validate the tasks of all the difficulties of all the reference tasks '
+                             '(or --task_ids), streamed into a jsonl file')
+    parser.add_argument('--task_ids', type=str, nargs='+', help='Reference tasks of the batch', default=None)
+    parser.add_argument('--diffs', type=str, nargs='+', help='Difficulties of the batch',
+                        default=['easy', 'medium', 'hard'])
+    parser.add_argument('--max_workers', type=int, help='Processes that validate the tasks', default=1)
+    parser.add_argument('--save_dir', type=str, help='', default='./results/datagen')
 
     args = parser.parse_args()
 
-    # save to json
-    ref_task_json = load_task_json(args.task_id)
-    ref_code_json = load_code_json(args.task_id)
-    syn_task_json, syn_code_json = generate(ref_task_json, ref_code_json, args.diff)
-
-    create_task_code_img_sidebyside(syn_task_json=syn_task_json, syn_code_json=syn_code_json,
-                                    ref_task_json=ref_task_json, ref_code_json=ref_code_json, show=False,
-                                    diff=args.diff, save=True, show_ref=args.show_ref,
-                                    filename=f'./results/datagen/image/{args.task_id}_{args.diff}_rotateflip.png')
+    if args.batch:
+        n_valid, n_tasks = generate_batch(args.task_ids or load_task_ids(), args.diffs, args.save_dir,
+                                          max_workers=args.max_workers, save_img=args.save_img,
+                                          show_ref=args.show_ref)
+        print(f'{n_valid}/{n_tasks} valid tasks saved to {args.save_dir}/task/task_rotateflip.jsonl')
+    else:
+        # save to json
+        ref_task_json = load_task_json(args.task_id)
+        ref_code_json = load_code_json(args.task_id)
+        syn_task_json, syn_code_json = generate(ref_task_json, ref_code_json, args.diff)
+
+        create_task_code_img_sidebyside(syn_task_json=syn_task_json, syn_code_json=syn_code_json,
+                                        ref_task_json=ref_task_json, ref_code_json=ref_code_json, show=False,
+                                        diff=args.diff, save=True, show_ref=args.show_ref,
+                                        filename=f'./results/datagen/image/{args.task_id}_{args.diff}_rotateflip.png')
@@ -3,9 +3,8 @@ from src.xlogomini.utils.helpers import yx2i, i2y, i2x, i2yx
 from src.xlogomini.components.task import Task
 from src.xlogomini.utils.enums import ITEM_CHAR, ITEM_FRUIT, ITEM_SHAPE
 from src.xlogomini.utils.load_data import load_task_json
-from networkx import Graph, node_connected_component
+from src.xlogomini.components.code.xlogo_ast import parse_code, cal_node_distance
 import numpy as np
-import torch as th
 import copy
 
 
@@ -74,6 +73,7 @@ def compute_task_score(ref_task, syn_task, debug=False):
 
 
 def compute_world_conceptual_distance(ref_task, syn_task):
+    import torch as th
     ref_concep_vec = ref_task.world.getWorldStats()
     syn_concep_vec = syn_task.world.getWorldStats()
     return th.mean((ref_concep_vec - syn_concep_vec) ** 2)
@@ -84,6 +84,7 @@ def compute_world_vis_distance(ref_world, syn_world):
     Compute the visual similarity between the reference task and synthesized task.
     Return the similarity score between 0 and 1.
     """
+    import torch as th
     max_padding = max(ref_world.rows, ref_world.cols, syn_world.rows, syn_world.cols)
 
     t_ref = ref_world.toPytorchTensor(max_padding)
@@ -119,6 +120,7 @@ def compute_world_vis_distance(ref_world, syn_world):
 
 
 def compute_goal_distance(ref_goal, syn_goal):
+    import torch as th
     ref_vec = {
         "find"      : 0,
         "forbid"    : 0,
@@ -143,6 +145,7 @@ def compute_goal_distance(ref_goal, syn_goal):
 
 
 def compute_cons_distance(ref_cons, syn_cons):
+    import torch as th
     ref_cons = th.FloatTensor([
         len(ref_cons.exactly.cons),
         len(ref_cons.most.cons),
@@ -156,6 +159,188 @@ def compute_cons_distance(ref_cons, syn_cons):
     return th.mean((ref_cons - syn_cons) ** 2)
 
 
+# channels of `World.toPytorchTensor` without the 4 turtle channels:
+# tile (0-5), item name (6-11), item color (12-20), item count (21-24), marker color (25-60)
+N_CELL_FEATS = 61
+COLOR_LIST = ["red", "green", "blue", "yellow", "black", "orange", "purple", "pink", "white"]
+ITEM_NAME_LIST = ['strawberry', 'lemon', 'circle', 'rectangle', 'triangle', 'cross']
+GOAL_OBJ_NAMES = ["find", "forbid", "findonly", "sum", "concat", "collectall", "draw"]
+
+
+def world_cell_features(world, padding):
+    """
+    Return the per-cell features of the world as a 0/1 array of shape (61, padding, padding).
+    """
+    feats = np.zeros((N_CELL_FEATS, padding, padding), dtype=np.uint8)
+    for r in range(world.rows):
+        for c in range(world.cols):
+            tile = world.tiles[r, c]
+            if tile.exist:
+                feats[0:6, r, c] = [tile.wall_top, tile.wall_right, tile.wall_bottom, tile.wall_left,
+                                    tile.allowed, tile.exist]
+
+            item = world.items[r, c]
+            if item is not None:
+                if item.name in ITEM_NAME_LIST:
+                    feats[6 + ITEM_NAME_LIST.index(item.name), r, c] = 1
+                if item.color in COLOR_LIST:
+                    feats[12 + COLOR_LIST.index(item.color), r, c] = 1
+                if int(item.count) in [1, 2, 3, 4]:
+                    feats[21 + int(item.count) - 1, r, c] = 1
+
+            marker = world.markers[r, c]
+            for k, color in enumerate([marker.top_color, marker.right_color, marker.bottom_color, marker.left_color]):
+                if color in COLOR_LIST:
+                    feats[25 + 4 * COLOR_LIST.index(color) + k, r, c] = 1
+    return feats
+
+
+def featurize_tasks(tasks, padding):
+    """
+    Featurize the tasks into stacked arrays, which are used by `compute_task_scores`.
+    """
+    n = len(tasks)
+    feats = {
+        "cells": np.zeros((n, N_CELL_FEATS, padding, padding), dtype=np.uint8),
+        "rows" : np.array([task.world.rows for task in tasks]),
+        "cols" : np.array([task.world.cols for task in tasks]),
+        "dir"  : np.array([task.world.turtle.dir for task in tasks]),
+        "pos"  : np.array([yx2i(task.world.turtle.y, task.world.turtle.x, task.world.cols) for task in tasks]),
+        "goal" : np.zeros((n, len(GOAL_OBJ_NAMES))),
+        "cons" : np.array([[len(task.constraints.exactly.cons),
+                            len(task.constraints.most.cons),
+                            len(task.constraints.start.cons)] for task in tasks]).reshape(n, 3) / 3
+    }
+    for i, task in enumerate(tasks):
+        feats['cells'][i] = world_cell_features(task.world, padding)
+        for obj_name in task.goal.objs:
+            feats['goal'][i, GOAL_OBJ_NAMES.index(obj_name)] += len(task.goal.objs[obj_name])
+    return feats
+
+
+def compute_world_stats_batch(feats):
+    """
+    Vectorized version of `World.getWorldStats`. Return an array of shape (n, 7).
+    """
+    cells = feats['cells'].astype(np.int64)
+    n_tiles = feats['rows'] * feats['cols']
+
+    name_cnt = cells[:, 6:12].sum(axis=(2, 3))
+    color_cnt = cells[:, 12:21].sum(axis=(2, 3))
+    marker_color_cnt = cells[:, 25:61].reshape(len(cells), len(COLOR_LIST), 4, cells.shape[-1] ** 2).sum(axis=(2, 3))
+    straw_cnt = (cells[:, 6:7] * cells[:, 21:25]).sum(axis=(2, 3))  # strawberry with count 1-4
+
+    n_shapes = (name_cnt[:, 2:6] > 0).sum(axis=1) / 4
+    n_colors = (color_cnt > 0).sum(axis=1) / len(COLOR_LIST)
+    n_fruits = ((straw_cnt[:, 0] > 0).astype(int) + (name_cnt[:, 1] > 0).astype(int)) / 2
+    use_counting = (straw_cnt[:, 1:].sum(axis=1) > 0).astype(int)
+    n_marker_colors = (marker_color_cnt > 0).sum(axis=1) / len(COLOR_LIST)
+    n_walls = cells[:, 0:4].sum(axis=(1, 2, 3)) / (n_tiles * 4)
+    # the forbidden areas are normalized twice, the same as `World.getWorldStats`
+    n_forb = (cells[:, 5] - cells[:, 4]).sum(axis=(1, 2)) / n_tiles / n_tiles
+
+    return np.stack([n_shapes, n_colors, n_fruits, use_counting, n_marker_colors, n_walls, n_forb], axis=1)
+
+
+def n_standalone_walls_batch(feats):
+    """
+    Vectorized version of `n_standalone_walls`. Return an array of shape (n,).
+    """
+    cells = feats['cells'].astype(bool)
+    top, right, bottom, left, allowed = cells[:, 0], cells[:, 1], cells[:, 2], cells[:, 3], cells[:, 4]
+
+    n = (top[:, 1:, :] & allowed[:, 1:, :] & allowed[:, :-1, :]).sum(axis=(1, 2))
+    n += (bottom[:, :-1, :] & allowed[:, :-1, :] & allowed[:, 1:, :]).sum(axis=(1, 2))
+    n += (right[:, :, :-1] & allowed[:, :, :-1] & allowed[:, :, 1:]).sum(axis=(1, 2))
+    left_sl = left[:, :, 1:] & allowed[:, :, 1:] & allowed[:, :, :-1]
+    # `is_standalone_wall` skips the left neighbor with index 0, i.e., the left wall of tile (0, 1)
+    left_sl[:, 0, 0] = False
+    n += left_sl.sum(axis=(1, 2))
+    return n
+
+
+def compute_task_scores(ref_task, syn_tasks):
+    """
+    Vectorized version of `compute_task_score` for a list of synthesized tasks.
+    Return an array of shape (len(syn_tasks),).
+    """
+    return ReferenceScorer(ref_task).task_scores(syn_tasks)
+
+
+class ReferenceScorer(object):
+    """
+    Score synthesized (task, code) pairs against a fixed reference (task, code).
+    The features of the reference are computed once when the scorer is built.
+    """
+
+    def __init__(self, ref_task, ref_code=None):
+        self.ref_task = ref_task
+        self.ref_code = ref_code
+
+        self.padding = max(ref_task.rows, ref_task.cols)
+        self.feats = featurize_tasks([ref_task], self.padding)
+        self.world_stats = compute_world_stats_batch(self.feats)
+        self.goal_vec = self.feats['goal']
+        self.cons_vec = self.feats['cons']
+        self.code_tree = parse_code(ref_code.astJson) if ref_code is not None else None
+
+    def _padded_cells(self, padding):
+        cells = self.feats['cells']
+        if padding > self.padding:
+            extra = padding - self.padding
+            cells = np.pad(cells, ((0, 0), (0, 0), (0, extra), (0, extra)))
+        return cells
+
+    def task_scores(self, syn_tasks):
+        """
+        Return the task scores (see `compute_task_score`) as an array of shape (len(syn_tasks),).
+        """
+        padding = max([self.padding] + [max(t.rows, t.cols) for t in syn_tasks])
+        syn_feats = featurize_tasks(syn_tasks, padding)
+
+        # visual distance, padded to max(rows, cols) of both worlds
+        n_diff_cells = (syn_feats['cells'] != self._padded_cells(padding)).sum(axis=(1, 2, 3))
+        n_diff_dir = 2 * (syn_feats['dir'] != self.feats['dir'][0])
+        n_diff_pos = 2 * (syn_feats['pos'] != self.feats['pos'][0])
+        max_padding = np.maximum(np.maximum(syn_feats['rows'], syn_feats['cols']), self.padding)
+        vis_distance = (n_diff_cells + n_diff_dir + n_diff_pos) / (
+                N_CELL_FEATS * max_padding ** 2 + 4 + max_padding ** 2)
+
+        concept_distance = np.mean((compute_world_stats_batch(syn_feats) - self.world_stats) ** 2, axis=1)
+        goal_distance = np.mean((syn_feats['goal'] - self.goal_vec) ** 2, axis=1)
+        cons_distance = np.mean((syn_feats['cons'] - self.cons_vec) ** 2, axis=1)
+        n_sl_walls = n_standalone_walls_batch(syn_feats)
+
+        return (vis_distance - (concept_distance + goal_distance + cons_distance)) * (100 - n_sl_walls) / 100
+
+    def code_score(self, syn_code):
+        """
+        Return the tree edit distance between the reference code and `syn_code`.
+        """
+        return float(cal_node_distance(self.code_tree, parse_code(syn_code.astJson)))
+
+    def score(self, syn_task, syn_code):
+        """
+        Return (final_score, task_score, code_score) for a synthesized (task, code).
+        """
+        return self.score_many([syn_task], [syn_code])[0]
+
+    def score_many(self, syn_tasks, syn_codes):
+        """
+        Return a list of (final_score, task_score, code_score), one for each synthesized (task, code).
+        """
+        assert self.code_tree is not None, "ref_code is required to score the codes"
+        assert len(syn_tasks) == len(syn_codes)
+
+        scores = []
+        for task_score, syn_code in zip(self.task_scores(syn_tasks), syn_codes):
+            task_score = float(task_score)
+            code_score = self.code_score(syn_code)
+            final_score = float(task_score + 0.1 * code_score / max(self.ref_code.n_blocks, syn_code.n_blocks))
+            scores.append((final_score, task_score, code_score))
+        return scores
+
+
 def compute_task_reachability(task):
     """
     Compute the reachability of a task. Return the ratio of bad items over all items.
@@ -216,6 +401,7 @@ def compute_task_reachability(task):
     items = task.world.items
     nodes_and_edges = build_world_graph(task.world)
 
+    from networkx import Graph, node_connected_component
     G = Graph(nodes_and_edges)
     # subax1 = plt.subplot(121)
     # nx.draw(G, with_labels=True)
@@ -7,7 +7,6 @@ from src.xlogomini.components.world.tile import Tile
 from src.xlogomini.components.world.item import Item
 from src.xlogomini.components.world.marker import Line
 import numpy as np
-import pandas as pd
 from src.xlogominidatagen.symexecution.decision_maker import RandomDecisionMaker
 
 
@@ -351,6 +350,7 @@ class SymWorld(object):
                     if world_map[y_, x_] is None:
                         world_map[y_, x_] = ''
 
+        import pandas as pd
         world_map = pd.DataFrame(world_map)
         # insert sep cols
         for i in range(self.cols + 1):
@@ -0,0 +1,166 @@
+import json
+from src.xlogomini.components.code.xlogo_code import Code
+from src.xlogomini.components.world.world import World
+from src.xlogomini.utils.enums import ITEM_CHAR, ITEM_COLOR, ITEM_NAME
+from src.xlogomini.utils.helpers import i2yx
+from src.xlogominidatagen.symexecution.symbolic_executor import SymExecutor
+
+
+def trace_shape(trace, cols, init_dir):
+    """
+    Return the shape of a trace: the offsets (dy, dx) of the visited cells from the first one,
+    rotated as if the turtle started facing north. Codes with the same shape have the same pworlds.
+    """
+    y0, x0 = i2yx(trace[0], cols)
+    shape = []
+    for i in trace:
+        y, x = i2yx(i, cols)
+        dy, dx = y - y0, x - x0
+        for _ in range(init_dir):
+            dy, dx = -dx, dy  # rotate 90 degrees counterclockwise
+        shape.append((dy, dx))
+    return tuple(shape)
+
+
+def code_trace_stats(code_json, cache):
+    """
+    Emulate the code once in an empty 8x8 grid and return {'n_cells', 'trace_len', 'n_visited', 'shape'},
+    where `n_cells` is the size of the bounding box of the trace (at least 3x3). The trace only
+    depends on the code up to a translation and a rotation. Return None if the code does not fit in the grid.
+    The stats are cached in `cache` by the code, since a code is shared by many triples.
+    """
+    key = json.dumps(code_json)
+    if key not in cache:
+        TEST_SIZE = 8
+        pworld = SymExecutor().execute_with_random_world(rows=TEST_SIZE, cols=TEST_SIZE, code=Code(code_json))
+        if pworld is None:
+            cache[key] = None
+        else:
+            ys, xs = zip(*[i2yx(i, TEST_SIZE) for i in pworld.trace])
+            cache[key] = {
+                'n_cells'  : max(max(ys) - min(ys) + 1, 3) * max(max(xs) - min(xs) + 1, 3),
+                'trace_len': len(pworld.trace),
+                'n_visited': len(set(pworld.trace)),
+                'shape'    : trace_shape(pworld.trace, TEST_SIZE, pworld.init_turtle.dir),
+            }
+    return cache[key]
+
+
+def possible_items(ref_world_json):
+    """
+    Return the (name, color, max count) of the items that the worlds synthesized for the reference
+    world can contain, as allowed by `Code2Tasks` and `WorldSMT._properties_for_sim_items`.
+    Return None for marker worlds, which have no items.
+    """
+    ref_world = World.init_from_json(ref_world_json)
+    if ref_world.markers_used:
+        return None
+
+    items = []
+    if 'fruit' in ref_world.itemtypes_used:
+        items.append(('strawberry', 'red', 4 if ref_world.use_count else 1))
+        items.append(('lemon', 'yellow', 1))
+    if 'shape' in ref_world.itemtypes_used:
+        circle_colors = ['red', 'green', 'blue'] if len(ref_world.shapes_used) >= 3 else sorted(ITEM_COLOR)
+        items.extend([(shape, color, 1) for shape in ['triangle', 'rectangle', 'cross'] for color in
+                      ['red', 'green', 'blue']])
+        items.extend([('circle', color, 1) for color in circle_colors])
+    if 'char' in ref_world.itemtypes_used:
+        items.extend([(char, 'black', 1) for char in sorted(ITEM_CHAR)])
+    return items
+
+
+def satisfies(item, cnf):
+    """
+    Whether the item (name, color, max count) can satisfy the cnf of a spec. The literals other
+    than names and colors are not checked, and are assumed to be satisfiable.
+    """
+    name, color, _ = item
+    for clause in cnf:
+        satisfied = False
+        for literal in clause:
+            neg = literal.startswith('-')
+            value = literal[1:] if neg else literal
+            if value not in ITEM_NAME and value not in ITEM_COLOR:
+                satisfied = True
+            elif (value in (name, color)) != neg:
+                satisfied = True
+            if satisfied:
+                break
+        if not satisfied:
+            return False
+    return True
+
+
+def infeasible_reason(code_stats, goal, items):
+    """
+    Return why no task can exist for a (code, goal) pair, or None if it may be feasible. Only
+    necessary conditions of the objectives in `GoalSMT` are checked, so a feasible pair is never
+    rejected:
+        - each target spec has to be satisfiable by some item of the world
+        - `sum` needs enough visited cells for `total_cnt` strawberries
+        - `collectall` needs 2 visited cells, `concat` one visited cell per spec
+    """
+    for obj_name, objs in goal.objs.items():
+        if obj_name in ['forbid', 'draw']:
+            # any world without items satisfies `forbid`, and the lines of `draw` come from the code
+            continue
+
+        for obj in objs:
+            if items is not None:
+                targets = [item for item in items if obj_name != 'sum' or item[0] == 'strawberry']
+                if not all(any(satisfies(item, spec.cnf) for item in targets) for spec in obj.specs):
+                    return 'items'
+
+            if code_stats is None:
+                continue
+            if obj_name == 'sum':
+                max_count = max([item[2] for item in items if item[0] == 'strawberry'], default=1) \
+                    if items is not None else 4
+                if obj.total_cnt > max_count * code_stats['n_visited']:
+                    return 'trace'
+            elif obj_name == 'collectall' and code_stats['n_visited'] < 2:
+                return 'trace'
+            elif obj_name == 'concat' and code_stats['n_visited'] < len(obj.specs):
+                return 'trace'
+    return None
+
+
+class UnsatRules(object):
+    """
+    Rules learned from the unsat cores of the triples without any task (see `Code2Tasks.pworld_solver`):
+    the objectives of the goal in the cores are infeasible with the traces of the same shape, and with
+    the same code constraints if the trace optimality is in the cores too. A triple whose goal contains
+    all the objectives of a rule for its trace shape is assumed to be infeasible as well. The cores only
+    hold for the initial positions of the turtle tried so far, so this is a heuristic.
+    """
+
+    def __init__(self):
+        self.rules = {}  # trace shape -> list of (objectives as json strings, code constraints or None)
+
+    def __len__(self):
+        return sum(len(rules) for rules in self.rules.values())
+
+    def add(self, shape, core, goal, cons_json):
+        """
+        Learn the rule of the unsat `core` of a triple. Draw goals are skipped, since their lines
+        come from the code and not only from its trace.
+        """
+        if shape is None or 'draw' in goal.objs:
+            return
+        objs = [json.dumps(obj.to_json()) for name in goal.objs.keys() for obj in goal.objs[name]]
+        rule = (frozenset(objs[k] for k in range(len(objs)) if f'goal_{k}' in core),
+                json.dumps(cons_json) if 'trace_opt' in core else None)
+        if rule not in self.rules.setdefault(shape, []):
+            self.rules[shape].append(rule)
+
+    def match(self, shape, goal, cons_json):
+        """
+        Whether a triple with the trace `shape`, `goal` and `cons_json` is pruned by a rule.
+        """
+        if shape is None or shape not in self.rules:
+            return False
+        objs = {json.dumps(obj.to_json()) for name in goal.objs.keys() for obj in goal.objs[name]}
+        cons = json.dumps(cons_json)
+        return any(rule_objs <= objs and (rule_cons is None or rule_cons == cons)
+                   for rule_objs, rule_cons in self.rules[shape])
@@ -4,49 +4,90 @@ import numpy as np
 from tqdm import tqdm
 import argparse
 import os
+import heapq
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from src.xlogomini.components.task import Task
 from src.xlogomini.components.code.xlogo_ast import Code
 from src.xlogomini.utils.load_data import load_task_json, load_code_json
-from src.xlogomini.components.code.xlogo_ast import cal_tree_distance
 from src.xlogomini.utils.image_conversions import create_task_code_img_sidebyside
-from xlogominidatagen.scoring import compute_task_score
+from xlogominidatagen.scoring import ReferenceScorer
+from xlogominidatagen.quantiles import P2Quantile
+
+
+def score_syn_jsons(ref_task_json, ref_code_json, syn_json_list, progress=False):
+    """
+    Return a list of (final_score, task_score, code_score), one for each synthesized json.
+    """
+    ref_task = Task.init_from_json(ref_task_json)
+    ref_code = Code(ref_code_json)
+
+    # get task & code
+    syn_tasks, syn_codes = [], []
+    for syn_json in tqdm(syn_json_list, desc="Loading synthesized tasks", disable=not progress):
+        syn_task_json = syn_json['task_json']
+        syn_task_json['constraints'] = syn_json['constraints']
+        syn_tasks.append(Task.init_from_json(syn_task_json))
+        syn_codes.append(Code(syn_json['code_json']))
+
+    # score tasks in a batch
+    scorer = ReferenceScorer(ref_task=ref_task, ref_code=ref_code)
+    return scorer.score_many(syn_tasks, syn_codes)
+
+
+def score_syn_jsons_wrapper(args_tuple):
+    return score_syn_jsons(*args_tuple)
+
+
+def render_wrapper(kwargs):
+    create_task_code_img_sidebyside(**kwargs)
+
+
+def get_quartile_range(quartiles, quartile):
+    if quartile == 1:
+        return 0, quartiles[0]
+    elif quartile == 2:
+        return quartiles[0], quartiles[1]
+    elif quartile == 3:
+        return quartiles[1], quartiles[2]
+    else:  # quartile == 4
+        return quartiles[2], 99999
 
 
 def generate(task_id, diff, quartile=4, show=False, show_ref=False,
-             selection='topk', n_sample=3, save=False):
+             selection='topk', n_sample=3, save=False, workers=1):
     # load ref task & code
     ref_task_json = load_task_json(task_id)
     ref_code_json = load_code_json(task_id)
-    ref_task = Task.init_from_json(ref_task_json)
-    ref_code = Code(ref_code_json)
 
     # load syn task & code
     syn_task_file = f"./results/datagen/task/task_{task_id}_{diff}_xlogosyn.json"
     os.makedirs(os.path.dirname(syn_task_file), exist_ok=True)
     syn_json_list = json.load(open(syn_task_file, 'r'))
 
-    scored_jsons = []
-
     # sample 10k from syn_json_list in case too many
     syn_json_list = random.sample(syn_json_list, min(10000, len(syn_json_list)))
 
     # score tasks
-    for syn_json in tqdm(syn_json_list, desc=f"Imaging task_{task_id}_{diff}_xlogosyn"):
-        # get json
-        syn_task_json = syn_json['task_json']
-        syn_task_json['constraints'] = syn_json['constraints']
-        syn_code_json = syn_json['code_json']
-
-        # get task & code
-        syn_task = Task.init_from_json(syn_task_json)
-        syn_code = Code(syn_code_json)
-
-        # get score
-        task_score = compute_task_score(ref_task=ref_task, syn_task=syn_task, debug=False).item()
-        code_score = cal_tree_distance(ref_code.astJson, syn_code.astJson).item()
-        final_score = float(task_score + 0.1 * code_score / max(ref_code.n_blocks, syn_code.n_blocks))
+    if workers > 1:
+        # score chunks of tasks in parallel, a few chunks per worker to balance the load
+        chunk_size = max(1, -(-len(syn_json_list) // (workers * 4)))
+        chunks = [syn_json_list[i:i + chunk_size] for i in range(0, len(syn_json_list), chunk_size)]
+        chunk_scores = [None] * len(chunks)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            future_to_idx = {executor.submit(score_syn_jsons_wrapper, (ref_task_json, ref_code_json, chunk)): idx
+                             for idx, chunk in enumerate(chunks)}
+            with tqdm(total=len(syn_json_list), desc=f"Scoring task_{task_id}_{diff}_xlogosyn",
+                      unit="task") as progress_bar:
+                for future in as_completed(future_to_idx):
+                    idx = future_to_idx[future]
+                    chunk_scores[idx] = future.result()
+                    progress_bar.update(len(chunks[idx]))
+        all_scores = [scores for chunk in chunk_scores for scores in chunk]
+    else:
+        all_scores = score_syn_jsons(ref_task_json, ref_code_json, syn_json_list, progress=True)
 
-        scored_jsons.append(((final_score, task_score, code_score), syn_json))
+    scored_jsons = list(zip(all_scores, syn_json_list))
 
     # sort
     scored_jsons.sort(key=lambda x: x[0][0], reverse=True)
@@ -54,15 +95,7 @@ def generate(task_id, diff, quartile=4, show=False, show_ref=False,
     # Calculate quartile boundaries
     final_scores = [scores[0] for scores, _ in scored_jsons]
     quartiles = np.percentile(final_scores, [25, 50, 75])
-
-    if quartile == 1:
-        quartile_range = (0, quartiles[0])
-    elif quartile == 2:
-        quartile_range = (quartiles[0], quartiles[1])
-    elif quartile == 3:
-        quartile_range = (quartiles[1], quartiles[2])
-    else:  # quartile == 4
-        quartile_range = (quartiles[2], 99999)
+    quartile_range = get_quartile_range(quartiles, quartile)
 
     # Filter images in the specified quartile
     quartile_jsons = [(scores, syn_json) for scores, syn_json in scored_jsons if
@@ -76,16 +109,125 @@ def generate(task_id, diff, quartile=4, show=False, show_ref=False,
     else:
         raise ValueError(f"Invalid selection: {selection}")
 
+    render_sampled_jsons(sampled_jsons, task_id, diff, ref_task_json, ref_code_json,
+                         quartile=quartile, selection=selection, show=show, show_ref=show_ref, save=save,
+                         workers=workers)
+
+
+def render_sampled_jsons(sampled_jsons, task_id, diff, ref_task_json, ref_code_json,
+                         quartile, selection, show, show_ref, save, workers):
     # Show or save sampled images
+    render_args = []
     for i, (scores, syn_json) in enumerate(sampled_jsons):
         syn_task_json = syn_json['task_json']
         syn_task_json['constraints'] = syn_json['constraints']
         syn_code_json = syn_json['code_json']
 
-        create_task_code_img_sidebyside(syn_task_json=syn_task_json, syn_code_json=syn_code_json,
-                                        ref_task_json=ref_task_json, ref_code_json=ref_code_json, show=show,
-                                        show_ref=show_ref, diff=diff, save=save,
-                                        filename=f"./results/datagen/image/{task_id}_{diff}_xlogosyn_q{quartile}_{selection}{i}.png")
+        render_args.append(dict(syn_task_json=syn_task_json, syn_code_json=syn_code_json,
+                                ref_task_json=ref_task_json, ref_code_json=ref_code_json, show=show,
+                                show_ref=show_ref, diff=diff, save=save,
+                                filename=f"./results/datagen/image/{task_id}_{diff}_xlogosyn_q{quartile}_{selection}{i}.png"))
+
+    # images can only be shown from the main process
+    if workers > 1 and not show:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(render_wrapper, render_args))
+    else:
+        for kwargs in render_args:
+            render_wrapper(kwargs)
+
+
+def read_jsonl_chunks(filename, chunk_size):
+    chunk = []
+    with open(filename, 'r') as f:
+        for line in f:
+            if line.strip():
+                chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+    if len(chunk) > 0:
+        yield chunk
+
+
+def score_jsonl_chunks(filename, ref_task_json, ref_code_json, chunk_size, workers):
+    """
+    Yield the scores of each chunk of the jsonl file in order. At most 2 chunks per worker are in flight.
+    """
+    if workers <= 1:
+        for chunk in read_jsonl_chunks(filename, chunk_size):
+            yield score_syn_jsons(ref_task_json, ref_code_json, chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in read_jsonl_chunks(filename, chunk_size):
+            pending.append(executor.submit(score_syn_jsons_wrapper, (ref_task_json, ref_code_json, chunk)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def generate_stream(task_id, diff, quartile=4, show=False, show_ref=False,
+                    selection='topk', n_sample=3, save=False, workers=1, chunk_size=1000):
+    """
+    Same as `generate`, but reads the synthesized tasks from a jsonl stream without sampling.
+
+    The quartile boundaries are estimated on the fly with P² estimators, and each quartile keeps a
+    bounded heap of candidates (the highest scores for `topk`, a reservoir for `sample`). Once the
+    stream ends, the candidates of all quartiles are filtered again with the final boundaries.
+    """
+    ref_task_json = load_task_json(task_id)
+    ref_code_json = load_code_json(task_id)
+
+    syn_task_file = f"./results/datagen/task/task_{task_id}_{diff}_xlogosyn.jsonl"
+    if selection not in ['topk', 'sample']:
+        raise ValueError(f"Invalid selection: {selection}")
+
+    estimators = [P2Quantile(p) for p in [0.25, 0.5, 0.75]]
+    n_candidates = max(10 * n_sample, 100)  # per quartile
+    heaps = [[] for _ in range(4)]
+    n_tasks = 0
+
+    with tqdm(desc=f"Scoring task_{task_id}_{diff}_xlogosyn", unit="task") as progress_bar:
+        for chunk in score_jsonl_chunks(syn_task_file, ref_task_json, ref_code_json, chunk_size, workers):
+            for scores in chunk:
+                for estimator in estimators:
+                    estimator.add(scores[0])
+                quartiles = [estimator.value() for estimator in estimators]
+                q = next((i for i in range(1, 4) if scores[0] <= get_quartile_range(quartiles, i)[1]), 4)
+
+                key = scores[0] if selection == 'topk' else random.random()
+                item = (key, n_tasks, scores)
+                if len(heaps[q - 1]) < n_candidates:
+                    heapq.heappush(heaps[q - 1], item)
+                else:
+                    heapq.heappushpop(heaps[q - 1], item)
+                n_tasks += 1
+            progress_bar.update(len(chunk))
+
+    # the candidates are indexed by their non-empty line in the stream, read them once more
+    candidates = {idx: scores for heap in heaps for _, idx, scores in heap}
+    candidate_jsons = {}
+    with open(syn_task_file, 'r') as f:
+        for i, line in enumerate(line for line in f if line.strip()):
+            if i in candidates:
+                candidate_jsons[i] = json.loads(line)
+
+    quartile_range = get_quartile_range([estimator.value() for estimator in estimators], quartile)
+    quartile_jsons = [(candidates[i], candidate_jsons[i]) for i in sorted(candidates.keys())
+                      if quartile_range[0] <= candidates[i][0] <= quartile_range[1]]
+
+    if selection == 'topk':
+        quartile_jsons.sort(key=lambda x: x[0][0], reverse=True)
+        sampled_jsons = quartile_jsons[:min(n_sample, len(quartile_jsons))]
+    else:
+        sampled_jsons = random.sample(quartile_jsons, min(n_sample, len(quartile_jsons)))
+
+    render_sampled_jsons(sampled_jsons, task_id, diff, ref_task_json, ref_code_json,
+                         quartile=quartile, selection=selection, show=show, show_ref=show_ref, save=save,
+                         workers=workers)
 
 
 if __name__ == '__main__':
@@ -98,12 +240,16 @@ if __name__ == '__main__':
     parser.add_argument('--quartile', type=int, help='quartile', default=4)
     parser.add_argument('--selection', type=str, help='topk or sample', default='topk')
     parser.add_argument('--n_sample', type=int, help='number of samples', default=5)
+    parser.add_argument('--workers', type=int, help='number of worker processes', default=1)
+    parser.add_argument('--stream', action='store_true',
+                        help='read all tasks from the jsonl stream instead of sampling 10k')
     args = parser.parse_args()
 
-    generate(args.task_id, args.diff,
+    (generate_stream if args.stream else generate)(args.task_id, args.diff,
              quartile=args.quartile,
              show=args.show_img,
              show_ref=args.show_ref,
              save=args.save_img,
              selection=args.selection,
-             n_sample=args.n_sample)
+             n_sample=args.n_sample,
+             workers=args.workers)
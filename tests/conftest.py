@@ -0,0 +1,6 @@
+import os
+import sys
+
+# the modules are imported as `src.xlogomini...`, and some of them as `xlogomini...`, as with PYTHONPATH="./:./src"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'src')]
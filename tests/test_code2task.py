@@ -0,0 +1,67 @@
+import random
+import time
+from z3 import unknown
+from src.xlogomini.components.goal.goal import Goal
+from src.xlogomini.components.world.world import World
+from src.xlogomini.utils.load_data import load_code_json, load_cons_json, load_goal_json, load_world_json
+from src.xlogominidatagen.code2task import Code2Tasks, interchangeable_values
+
+
+class CanceledSolver(object):
+    """
+    A solver whose checks are canceled, as z3 reports the checks stopped by the timeout of a deadline.
+    """
+
+    def set(self, key, value):
+        pass
+
+    def check(self):
+        return unknown
+
+    def reason_unknown(self):
+        return 'canceled'
+
+
+def code2tasks(task_id):
+    world_json = load_world_json(task_id)
+    ref_world = World.init_from_json(world_json)
+    return Code2Tasks(ref_world.rows, ref_world.cols, world_json, True)
+
+
+def first_pworld(c2t, task_id):
+    # the initial positions of the turtle are random
+    random.seed(0)
+    return c2t.symbolic_execution(code_json=load_code_json(task_id), n_inti_pos=4)[0]
+
+
+def test_canceled_check_is_truncated_by_its_deadline():
+    c2t = code2tasks('87')
+    pworld = first_pworld(c2t, '87')
+
+    worlds = c2t.pworld_to_worlds(CanceledSolver(), pworld, 10, deadlines={'pworld_time': time.time() + 60})
+
+    assert worlds == []
+    assert c2t.truncated == 'pworld_time'
+
+
+def test_tiny_deadline_is_recorded():
+    c2t = code2tasks('87')
+    pworld = first_pworld(c2t, '87')
+    solver = c2t.pworld_solver(pworld, load_cons_json('87'), Goal.init_from_json(load_goal_json('87')),
+                               load_world_json('87'))
+
+    c2t.pworld_to_worlds(solver, pworld, 100000, deadlines={'pworld_time': time.time() + 0.05})
+
+    assert c2t.truncated == 'pworld_time'
+
+
+def test_negated_goal_literal_is_not_interchangeable():
+    # the shapes other than circles are interchangeable in the worlds of task 22, unless a goal names them
+    c2t = code2tasks('22')
+    pworld = first_pworld(c2t, '22')
+    ref_world = World.init_from_json(load_world_json('22'))
+    goal = Goal.init_from_json([{"name": "collectall", "specs": [[[{"name": "triangle", "neg": 1}]]]}])
+
+    groups = interchangeable_values(ref_world, goal, pworld)
+
+    assert all('triangle' not in group for group in groups)
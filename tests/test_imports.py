@@ -0,0 +1,9 @@
+import pytest
+from src.xlogominidatagen.import_benchmark import ENTRY_POINTS, time_import
+
+
+@pytest.mark.parametrize('name', list(ENTRY_POINTS))
+def test_entry_point_does_not_import_forbidden_modules(name):
+    modules, _, forbidden = ENTRY_POINTS[name]
+    heavy = time_import(modules, repeat=1)['heavy']
+    assert [module for module in forbidden if module in heavy] == []